@@ -0,0 +1,25 @@
+
+def normalize_confidence(value) -> str:
+    value = str(value or "").upper()
+    for level in ["HIGH", "MEDIUM", "LOW"]:
+        if level in value:
+            return level
+    return "MEDIUM"
+
+
+def normalize_verdict(value) -> str:
+    # UNRELIABLE contains RELIABLE, so it has to be checked first
+    value = str(value or "").upper()
+    for v in ["UNRELIABLE", "QUESTIONABLE", "RELIABLE"]:
+        if v in value:
+            return v
+    return "RELIABLE"
+
+
+def normalize_status(value) -> str:
+    # Likewise UNVERIFIED before VERIFIED
+    value = str(value or "").upper()
+    for s in ["UNVERIFIED", "VERIFIED", "DISPUTED"]:
+        if s in value:
+            return s
+    return "UNVERIFIED"
@@ -0,0 +1,177 @@
+from typing import List, Dict, Tuple
+from core.llm import call
+from agents.review_labels import normalize_confidence, normalize_verdict, normalize_status
+from dotenv import load_dotenv
+import orjson
+
+load_dotenv()
+
+
+class ReviewAgent:
+    """
+    Critiques every summary and fact-checks claims across them in a single
+    LLM call. Produces the same critic and fact-checker output shapes the
+    separate agents did, so downstream agents are unaffected.
+    """
+
+    def __init__(self):
+        self.name = "Reviewer"
+        self.model = "llama-3.1-8b-instant"
+        self.temperature = 0.1
+        # The reply holds one critique per summary plus up to five claims
+        self.base_tokens = 400
+        self.tokens_per_summary = 150
+
+    def max_tokens(self, summary_count: int) -> int:
+        return self.base_tokens + self.tokens_per_summary * summary_count
+
+    def build_prompt(self, summaries: List[Dict], query: str) -> str:
+        combined = "".join(
+            f"\nSource {i+1} ({s['source']}):\n{s['summary']}\n"
+            for i, s in enumerate(summaries)
+        )
+
+        return f"""You are a critical research reviewer and fact-checker. You are given multiple research summaries on the same topic.
+
+Step 1 - Critique each summary. Check for:
+1. Vague or unsupported claims
+2. Potential bias or one-sided perspective
+3. Missing important context
+4. Contradictions or logical errors
+5. Relevance to the query
+
+Step 2 - Extract the 3-5 most important claims and verify them across the sources you did not judge UNRELIABLE.
+
+Query: {query}
+
+Summaries:
+{combined}
+
+Respond with a single JSON object in EXACTLY this shape:
+{{
+  "critiques": [
+    {{"idx": 1, "confidence": "HIGH or MEDIUM or LOW", "verdict": "RELIABLE or QUESTIONABLE or UNRELIABLE", "issues": "describe issues here, or None"}}
+  ],
+  "claims": [
+    {{"claim": "write the claim here", "status": "VERIFIED or DISPUTED or UNVERIFIED", "reason": "which sources agree or disagree and why"}}
+  ]
+}}
+Include one critique per source, using the source number as idx."""
+
+    def parse_review(self, response_text: str) -> Tuple[Dict[int, Dict], List[Dict]]:
+        """
+        Parse the JSON review into per-source critiques (keyed by 0-based
+        index) and a list of claims. Returns empty results, so every source
+        gets the fallback critique, if the reply isn't a JSON object.
+        """
+        try:
+            data = orjson.loads(response_text)
+        except orjson.JSONDecodeError as e:
+            print(f"  ⚠️ Reviewer returned invalid JSON ({e}), using fallback critiques")
+            return {}, []
+        if not isinstance(data, dict):
+            print("  ⚠️ Reviewer returned no JSON object, using fallback critiques")
+            return {}, []
+
+        critiques = {}
+        for c in data.get("critiques") or []:
+            try:
+                idx = int(c.get("idx")) - 1
+            except (AttributeError, TypeError, ValueError):
+                continue
+
+            critiques[idx] = {
+                "confidence": normalize_confidence(c.get("confidence")),
+                "issues": str(c.get("issues") or "None").strip() or "None",
+                "verdict": normalize_verdict(c.get("verdict"))
+            }
+
+        claims = []
+        for c in data.get("claims") or []:
+            if not isinstance(c, dict):
+                continue
+            claim = str(c.get("claim") or "").strip()
+            if not claim:
+                continue
+
+            claims.append({
+                "claim": claim,
+                "status": normalize_status(c.get("status")),
+                "reason": str(c.get("reason") or "").strip()
+            })
+
+        return critiques, claims
+
+    async def arun(self, summarizer_output: Dict) -> Tuple[Dict, Dict]:
+        """
+        Review all summaries from the Summarizer Agent.
+        Returns (critic_output, factchecker_output).
+        """
+        query = summarizer_output["query"]
+        summaries = summarizer_output["summaries"]
+        print(f"\n🔎 Review Agent: critiquing and fact-checking {len(summaries)} summaries...")
+
+        critiques, claims = {}, []
+        if summaries:
+            try:
+                response = await call(
+                    self.model, self.build_prompt(summaries, query),
+                    temperature=self.temperature, max_tokens=self.max_tokens(len(summaries)),
+                    json_mode=True
+                )
+                critiques, claims = self.parse_review(response.strip())
+            except Exception as e:
+                print(f"  ⚠️ Reviewer error: {e}")
+
+        critiqued = []
+        for i, item in enumerate(summaries):
+            critique = critiques.get(i, {
+                "confidence": "MEDIUM",
+                "issues": "Could not critique due to API error",
+                "verdict": "RELIABLE"
+            })
+            critiqued.append({
+                "source_index": item["source_index"],
+                "source": item["source"],
+                "url": item["url"],
+                "type": item["type"],
+                "summary": item["summary"],
+                "confidence": critique["confidence"],
+                "issues": critique["issues"],
+                "verdict": critique["verdict"],
+                "keep": critique["verdict"] != "UNRELIABLE"
+            })
+
+        reliable = [c for c in critiqued if c["keep"]]
+        if not reliable:
+            claims = []
+
+        verified = [c for c in claims if c["status"] == "VERIFIED"]
+        disputed = [c for c in claims if c["status"] == "DISPUTED"]
+        unverified = [c for c in claims if c["status"] == "UNVERIFIED"]
+
+        print(f"  → {len(reliable)}/{len(critiqued)} summaries passed critique")
+        print(f"  → Verified: {len(verified)} | Disputed: {len(disputed)} | Unverified: {len(unverified)}")
+
+        critic_output = {
+            "agent": "Critic",
+            "query": query,
+            "critiqued_summaries": critiqued,
+            "reliable_summaries": reliable,
+            "total_critiqued": len(critiqued),
+            "total_reliable": len(reliable),
+            "status": "done"
+        }
+
+        factchecker_output = {
+            "agent": "FactChecker",
+            "query": query,
+            "claims": claims,
+            "verified_claims": verified,
+            "disputed_claims": disputed,
+            "unverified_claims": unverified,
+            "reliable_summaries": reliable,
+            "status": "done"
+        }
+
+        return critic_output, factchecker_output
@@ -1,59 +1,75 @@
 from typing import List, Dict
-from core.websearch import search_web
+from core.websearch import search_web_async, WEB_SEARCH_TIMEOUT
 from core.retriever import HybridRetriever
 from dotenv import load_dotenv
+import asyncio
+import heapq
 import os
 
 load_dotenv()
 
+MAX_RESULTS = 7
+
 
 class SearcherAgent:
     def __init__(self, retriever: HybridRetriever = None):
         self.retriever = retriever
         self.name = "Searcher"
 
-    def run(self, query: str, has_documents: bool = False) -> Dict:
+    async def run_web(self, query: str) -> List[Dict]:
         """
-        Decides where to search based on context.
-        - If documents uploaded → search vector store
-        - If no documents → search web
-        - Always tries both and combines if possible
+        Web search with a hard timeout, so a slow provider degrades to
+        document-only results instead of stalling the pipeline.
         """
-        print(f"\n🔍 Searcher Agent: processing query: '{query}'")
+        print("  → Searching web...")
+        try:
+            return await asyncio.wait_for(
+                search_web_async(query, max_results=4),
+                timeout=WEB_SEARCH_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            print(f"  ⚠️ Web search timed out after {WEB_SEARCH_TIMEOUT}s")
+        except Exception as e:
+            print(f"  ⚠️ Web search error: {e}")
+        return []
 
-        results = []
-        sources_used = []
+    async def run_docs(self, query: str) -> List[Dict]:
+        """
+        Hybrid search over the user's uploaded documents, labelled as
+        Searcher results.
+        """
+        if not self.retriever:
+            return []
 
-        # --- Search uploaded documents if available ---
-        if has_documents and self.retriever:
-            print("  → Searching uploaded documents...")
-            doc_results = self.retriever.search(query, top_k=5)
-            if doc_results:
-                for r in doc_results:
-                    results.append({
-                        "content": r["text"],
-                        "source": f"Uploaded Document (chunk {r['chunk_id']})",
-                        "url": "",
-                        "score": r.get("combined_score", r.get("score", 0)),
-                        "type": "document"
-                    })
-                sources_used.append("documents")
-                print(f"  → Found {len(doc_results)} chunks from documents")
+        print("  → Searching uploaded documents...")
+        doc_results = await asyncio.to_thread(self.retriever.search, query, top_k=5)
+        return [
+            {
+                "content": r["text"],
+                "source": f"Uploaded Document (chunk {r['chunk_id']})",
+                "url": "",
+                "score": r.get("combined_score", r.get("score", 0)),
+                "type": "document"
+            }
+            for r in doc_results
+        ]
 
-        # --- Always search web for additional context ---
-        print("  → Searching web...")
-        web_results = search_web(query, max_results=4)
+    def merge(self, query: str, doc_results: List[Dict], web_results: List[Dict]) -> Dict:
+        """
+        Combine document and web results, keeping the top MAX_RESULTS by score.
+        """
+        sources_used = []
+        if doc_results:
+            sources_used.append("documents")
+            print(f"  → Found {len(doc_results)} chunks from documents")
         if web_results:
-            results.extend(web_results)
             sources_used.append("web")
             print(f"  → Found {len(web_results)} web results")
 
-        # Sort all results by score if available
-        results = sorted(
-            results,
-            key=lambda x: x.get("score", 0),
-            reverse=True
-        )[:7]  # keep top 7 total
+        # Keep the top results by score if available
+        results = heapq.nlargest(
+            MAX_RESULTS, doc_results + web_results, key=lambda x: x.get("score", 0)
+        )
 
         return {
             "agent": self.name,
@@ -62,4 +78,28 @@ class SearcherAgent:
             "sources_used": sources_used,
             "total_results": len(results),
             "status": "done"
-        }
\ No newline at end of file
+        }
+
+    async def arun(self, query: str, has_documents: bool = False) -> Dict:
+        """
+        Decides where to search based on context.
+        - If documents uploaded → search vector store
+        - Always searches web for additional context
+        Document and web searches run concurrently, then are merged.
+        """
+        print(f"\n🔍 Searcher Agent: processing query: '{query}'")
+
+        async def no_results() -> List[Dict]:
+            return []
+
+        doc_results, web_results = await asyncio.gather(
+            self.run_docs(query) if has_documents else no_results(),
+            self.run_web(query)
+        )
+        return self.merge(query, doc_results, web_results)
+
+    def run(self, query: str, has_documents: bool = False) -> Dict:
+        """
+        Synchronous wrapper around arun, for callers outside an event loop.
+        """
+        return asyncio.run(self.arun(query=query, has_documents=has_documents))
@@ -1,26 +1,37 @@
 from typing import List, Dict
-from langchain_groq import ChatGroq
+from core.llm import call
 from dotenv import load_dotenv
+import asyncio
+import hashlib
 import os
 
 load_dotenv()
 
+# Upper bound on in-flight Groq calls per run, to stay under rate limits
+MAX_CONCURRENT_SUMMARIES = 8
+
+# Carry a raw content excerpt alongside each summary (debugging only)
+KEEP_ORIGINAL_CONTENT = os.getenv("KEEP_ORIGINAL_CONTENT", "").lower() in ("1", "true", "yes")
+
+
+def content_fingerprint(content: str) -> bytes:
+    """
+    Hash of the first 500 characters, ignoring case and whitespace, so the
+    same snippet syndicated across sites is only summarized once.
+    """
+    normalized = " ".join(content[:500].lower().split())
+    return hashlib.blake2b(normalized.encode(), digest_size=8).digest()
+
 
 class SummarizerAgent:
     def __init__(self):
         self.name = "Summarizer"
-        self.llm = ChatGroq(
-            api_key=os.getenv("GROQ_API_KEY"),
-            model="llama-3.1-8b-instant",
-            temperature=0.3,
-            max_tokens=400
-        )
+        self.model = "llama-3.1-8b-instant"
+        self.temperature = 0.3
+        self.max_tokens = 400
 
-    def summarize_single(self, content: str, query: str) -> str:
-        """
-        Summarize a single source in context of the query.
-        """
-        prompt = f"""You are a research summarizer. Given a source and a research query,
+    def build_prompt(self, content: str, query: str) -> str:
+        return f"""You are a research summarizer. Given a source and a research query,
 write a concise 3-4 sentence summary of the source that is relevant to the query.
 Focus only on information that helps answer the query.
 Be factual and objective.
@@ -32,40 +43,73 @@ Source content:
 
 Write a concise summary:"""
 
+    async def asummarize_single(self, content: str, query: str) -> str:
+        """
+        Summarize a single source in context of the query.
+        """
         try:
-            response = self.llm.invoke(prompt)
-            return response.content.strip()
+            response = await call(
+                self.model, self.build_prompt(content, query),
+                temperature=self.temperature, max_tokens=self.max_tokens
+            )
+            return response.strip()
         except Exception as e:
             print(f"  ⚠️ Summarizer error: {e}")
             return content[:300] + "..."
 
-    def run(self, searcher_output: Dict) -> Dict:
+    async def arun(self, searcher_output: Dict) -> Dict:
         """
         Summarize each result from the Searcher Agent.
+        All sources are sent to the LLM concurrently.
         """
         print(f"\n📝 Summarizer Agent: summarizing {searcher_output['total_results']} sources...")
 
         query = searcher_output["query"]
         results = searcher_output["results"]
-        summaries = []
+        sem = asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES)
 
+        to_summarize = []
+        seen = set()
         for i, result in enumerate(results):
             content = result.get("content", "")
             if not content or len(content.strip()) < 50:
                 print(f"  → Skipping source {i+1} (too short)")
                 continue
 
-            print(f"  → Summarizing source {i+1}/{len(results)}...")
-            summary_text = self.summarize_single(content, query)
+            fingerprint = content_fingerprint(content)
+            if fingerprint in seen:
+                print(f"  → Skipping source {i+1} (duplicate content)")
+                continue
+            seen.add(fingerprint)
+
+            to_summarize.append((i, result, content))
+
+        async def summarize_one(i: int, content: str) -> str:
+            async with sem:
+                print(f"  → Summarizing source {i+1}/{len(results)}...")
+                return await self.asummarize_single(content, query)
+
+        summary_texts = await asyncio.gather(
+            *(summarize_one(i, content) for i, _, content in to_summarize),
+            return_exceptions=True
+        )
+
+        summaries = []
+        for (i, result, content), summary_text in zip(to_summarize, summary_texts):
+            if isinstance(summary_text, Exception):
+                print(f"  ⚠️ Summarizer error: {summary_text}")
+                summary_text = content[:300] + "..."
 
-            summaries.append({
+            summary = {
                 "source_index": i,
                 "source": result.get("source", ""),
                 "url": result.get("url", ""),
                 "type": result.get("type", "web"),
-                "original_content": content[:500],
                 "summary": summary_text
-            })
+            }
+            if KEEP_ORIGINAL_CONTENT:
+                summary["original_content"] = content[:500]
+            summaries.append(summary)
 
         print(f"  → Created {len(summaries)} summaries")
 
@@ -75,4 +119,10 @@ Write a concise summary:"""
             "summaries": summaries,
             "total_summaries": len(summaries),
             "status": "done"
-        }
\ No newline at end of file
+        }
+
+    def run(self, searcher_output: Dict) -> Dict:
+        """
+        Synchronous wrapper around arun, for callers outside an event loop.
+        """
+        return asyncio.run(self.arun(searcher_output))
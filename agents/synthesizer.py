@@ -1,7 +1,7 @@
-from typing import List, Dict
-from langchain_groq import ChatGroq
+from typing import AsyncIterator, List, Dict
+from core.llm import call, stream
 from dotenv import load_dotenv
-import os
+import asyncio
 
 load_dotenv()
 
@@ -9,37 +9,31 @@ load_dotenv()
 class SynthesizerAgent:
     def __init__(self):
         self.name = "Synthesizer"
-        self.llm = ChatGroq(
-            api_key=os.getenv("GROQ_API_KEY"),
-            model="llama-3.3-70b-versatile",
-            temperature=0.4,
-            max_tokens=1000
-        )
+        self.model = "llama-3.3-70b-versatile"
+        self.temperature = 0.4
+        self.max_tokens = 1000
 
     def build_context(self, reliable_summaries: List[Dict], claims: List[Dict]) -> str:
         """
         Build a structured context from summaries and verified claims.
         """
-        context = "=== VERIFIED RESEARCH SUMMARIES ===\n"
+        parts = ["=== VERIFIED RESEARCH SUMMARIES ===\n"]
         for i, s in enumerate(reliable_summaries):
-            context += f"\n[Source {i+1}] {s['source']}\n"
-            context += f"Confidence: {s.get('confidence', 'MEDIUM')}\n"
-            context += f"Summary: {s['summary']}\n"
+            parts.append(
+                f"\n[Source {i+1}] {s['source']}\n"
+                f"Confidence: {s.get('confidence', 'MEDIUM')}\n"
+                f"Summary: {s['summary']}\n"
+            )
 
         if claims:
-            context += "\n=== FACT-CHECKED CLAIMS ===\n"
+            parts.append("\n=== FACT-CHECKED CLAIMS ===\n")
             for c in claims:
                 status_emoji = "✓" if c["status"] == "VERIFIED" else "⚠" if c["status"] == "DISPUTED" else "?"
-                context += f"{status_emoji} [{c['status']}] {c['claim']}\n"
-
-        return context
+                parts.append(f"{status_emoji} [{c['status']}] {c['claim']}\n")
 
-    def run(self, factchecker_output: Dict) -> Dict:
-        """
-        Synthesize all agent outputs into a final structured answer.
-        """
-        print(f"\n✍️  Synthesizer Agent: generating final answer...")
+        return "".join(parts)
 
+    def build_prompt(self, factchecker_output: Dict) -> str:
         query = factchecker_output["query"]
         reliable_summaries = factchecker_output.get("reliable_summaries", [])
         all_claims = factchecker_output.get("claims", [])
@@ -51,7 +45,7 @@ class SynthesizerAgent:
         if disputed_claims:
             disputed_warning = f"\nNote: The following claims are disputed across sources: {', '.join([c['claim'] for c in disputed_claims])}"
 
-        prompt = f"""You are a research synthesizer. Based on verified research summaries and fact-checked claims,
+        return f"""You are a research synthesizer. Based on verified research summaries and fact-checked claims,
 write a comprehensive, well-structured answer to the research query.
 
 Research Query: {query}
@@ -78,10 +72,10 @@ Instructions:
 
 Write the answer now:"""
 
-        response = self.llm.invoke(prompt)
-        final_answer = response.content.strip()
-
-        # Build sources list for UI
+    def build_sources(self, reliable_summaries: List[Dict]) -> List[Dict]:
+        """
+        Build the sources list shown in the UI.
+        """
         sources = []
         for i, s in enumerate(reliable_summaries):
             sources.append({
@@ -91,16 +85,49 @@ Write the answer now:"""
                 "type": s.get("type", "web"),
                 "confidence": s.get("confidence", "MEDIUM")
             })
+        return sources
+
+    async def arun(self, factchecker_output: Dict) -> Dict:
+        """
+        Synthesize all agent outputs into a final structured answer.
+        """
+        print(f"\n✍️  Synthesizer Agent: generating final answer...")
+
+        response = await call(
+            self.model, self.build_prompt(factchecker_output),
+            temperature=self.temperature, max_tokens=self.max_tokens
+        )
+        final_answer = response.strip()
+
+        sources = self.build_sources(factchecker_output.get("reliable_summaries", []))
 
         print(f"  → Final answer generated ({len(final_answer)} characters)")
 
         return {
             "agent": self.name,
-            "query": query,
+            "query": factchecker_output["query"],
             "answer": final_answer,
             "sources": sources,
             "total_sources": len(sources),
             "verified_claims_count": len(factchecker_output.get("verified_claims", [])),
-            "disputed_claims_count": len(disputed_claims),
+            "disputed_claims_count": len(factchecker_output.get("disputed_claims", [])),
             "status": "done"
-        }
\ No newline at end of file
+        }
+
+    async def astream(self, factchecker_output: Dict) -> AsyncIterator[str]:
+        """
+        Stream the final answer as text deltas while the model generates it.
+        """
+        print("\n✍️  Synthesizer Agent: streaming final answer...")
+
+        async for delta in stream(
+            self.model, self.build_prompt(factchecker_output),
+            temperature=self.temperature, max_tokens=self.max_tokens
+        ):
+            yield delta
+
+    def run(self, factchecker_output: Dict) -> Dict:
+        """
+        Synchronous wrapper around arun, for callers outside an event loop.
+        """
+        return asyncio.run(self.arun(factchecker_output))
@@ -1,15 +1,26 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Response, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List
-from core.database import get_db, ChatHistory
-from core.graph import run_research_pipeline
+from typing import List, Optional
+from datetime import datetime
+from core.database import get_db, ChatHistory, unpack_json
+from core.history import save_history
+from core.graph import run_research_pipeline, run_review_pipeline
+from core.llm import call, stream, set_cache_owner
+from core import llm_cache
 from core.firebase_auth import verify_token, get_user_id
 from core.security import limiter, validate_query, sanitize_filename
-from utils.pdf_parser import parse_pdf, get_pdf_metadata
-import json
+from agents.synthesizer import SynthesizerAgent
+from core.embeddings import forget_embeddings
+from utils.pdf_parser import Chunk, parse_pdf, ingest_pdf, forget_cached_pdf, clear_pdf_cache
+import aiofiles
+import asyncio
+import orjson
 import os
 import shutil
+import tempfile
 
 router = APIRouter()
 
@@ -17,6 +28,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 MAX_DOCUMENTS_PER_USER = 10
 MAX_FILE_SIZE_MB = 20
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
 
 def get_user_upload_dir(user_id: str) -> str:
@@ -25,6 +37,77 @@ def get_user_upload_dir(user_id: str) -> str:
     return upload_dir
 
 
+def get_user_pdf_cache_dir(user_id: str) -> str:
+    # Inside the user's data dir, so it goes when their vector store does
+    return os.path.join(BASE_DIR, "data", "users", user_id, "pdf_cache")
+
+
+def _chunk_texts(retriever) -> set:
+    return {chunk["text"] for chunk in retriever.vector_store.chunks}
+
+
+def _forget_removed_texts(retriever, before: set):
+    # Cached embeddings of text no longer indexed shouldn't outlive the document
+    removed = before - _chunk_texts(retriever)
+    if removed:
+        forget_embeddings(list(removed))
+
+
+# Callers hold the user's lock (main.locked_user_retriever); retriever.lock
+# only keeps concurrent searches from seeing a half-updated index.
+def _index_document(retriever, chunks: List[Chunk], filename: str):
+    with retriever.lock:
+        before = _chunk_texts(retriever)
+        # Re-uploading a file replaces its previous chunks
+        retriever.delete_by_source(filename)
+        retriever.add_many(chunk.to_dict(source=filename) for chunk in chunks)
+        retriever.vector_store.save()
+        _forget_removed_texts(retriever, before)
+
+
+def _remove_document(retriever, upload_dir: str, filename: str, cache_dir: str):
+    with retriever.lock:
+        before = _chunk_texts(retriever)
+        if retriever.has_untagged_chunks():
+            # Index predates per-document tagging — rebuild from remaining files
+            retriever.vector_store.clear()
+            remaining_files = [
+                f for f in os.listdir(upload_dir) if f.endswith(".pdf")
+            ]
+            all_chunks = []
+            for f in remaining_files:
+                chunks = parse_pdf(os.path.join(upload_dir, f), cache_dir)
+                all_chunks.extend(chunk.to_dict(source=f) for chunk in chunks)
+            if all_chunks:
+                retriever.index_chunks(all_chunks)
+        else:
+            retriever.delete_by_source(filename)
+
+        if retriever.is_ready():
+            retriever.vector_store.save()
+        else:
+            # No docs left — clear vector store
+            retriever.vector_store.clear()
+            retriever.bm25 = None
+            retriever.chunks = []
+        _forget_removed_texts(retriever, before)
+
+
+def _purge_user_documents(retriever, user_id: str):
+    """
+    Drop a user's cached parse results and chunk embeddings.
+    """
+    if retriever is not None:
+        texts = _chunk_texts(retriever)
+        if texts:
+            forget_embeddings(list(texts))
+    clear_pdf_cache(get_user_pdf_cache_dir(user_id))
+
+
+def _sse(event: dict) -> str:
+    return f"data: {orjson.dumps(event, option=orjson.OPT_SERIALIZE_NUMPY).decode()}\n\n"
+
+
 class QueryRequest(BaseModel):
     query: str
     use_documents: bool = True
@@ -52,30 +135,50 @@ async def upload_document(
     if not filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
-    # Check file size
-    contents = await file.read()
-    size_mb = len(contents) / (1024 * 1024)
-    if size_mb > MAX_FILE_SIZE_MB:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE_MB}MB."
-        )
-    await file.seek(0)
-
-    # Save to user folder
+    # Stream to user folder, enforcing the size cap as we go. The partial
+    # file has a unique name, so concurrent uploads of one filename don't
+    # write into each other
     upload_dir = get_user_upload_dir(user_id)
     file_path = os.path.join(upload_dir, filename)
-    with open(file_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    fd, partial_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    os.close(fd)
+    max_bytes = MAX_FILE_SIZE_MB * 1024 * 1024
+    total = 0
 
     try:
-        chunks = parse_pdf(file_path)
-        metadata = get_pdf_metadata(file_path)
+        async with aiofiles.open(partial_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_bytes:
+                    break
+                await f.write(chunk)
+    except BaseException:
+        # Client disconnect or I/O error mid-upload
+        os.remove(partial_path)
+        raise
 
-        from main import get_user_retriever
-        retriever = get_user_retriever(user_id)
-        retriever.index_chunks(chunks)
-        retriever.vector_store.save()
+    if total > max_bytes:
+        os.remove(partial_path)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {MAX_FILE_SIZE_MB}MB."
+        )
+    cache_dir = get_user_pdf_cache_dir(user_id)
+
+    try:
+        # Parsing and embedding are CPU-bound; keep them off the event loop.
+        # Ingest from the partial file: a previous upload of this filename
+        # stays in place, and indexed, unless the new one makes it through
+        ingested = await asyncio.to_thread(ingest_pdf, partial_path, cache_dir)
+        chunks, metadata = ingested["chunks"], ingested["metadata"]
+
+        from main import locked_user_retriever
+        async with locked_user_retriever(user_id) as retriever:
+            if os.path.exists(file_path):
+                # Replacing a file: its old parse shouldn't linger in the cache
+                await asyncio.to_thread(forget_cached_pdf, file_path, cache_dir)
+            await asyncio.to_thread(_index_document, retriever, chunks, filename)
+            os.replace(partial_path, file_path)
 
         return {
             "message": "Document uploaded successfully",
@@ -86,9 +189,11 @@ async def upload_document(
         }
 
     except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
+    finally:
+        # Still there only if the upload failed; the old file is untouched
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
 
 
 @router.post("/query", response_model=QueryResponse)
@@ -96,34 +201,31 @@ async def upload_document(
 async def query(
     request: Request,
     body: QueryRequest,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
     token: dict = Depends(verify_token)
 ):
     user_id = get_user_id(token)
+    set_cache_owner(user_id)
 
     # Validate and sanitize query
     clean_query = validate_query(body.query)
 
     try:
         from main import get_user_retriever
-        retriever = get_user_retriever(user_id)
+        retriever = await get_user_retriever(user_id)
         has_documents = body.use_documents and retriever.is_ready()
 
-        result = run_research_pipeline(
+        result = await run_research_pipeline(
             query=clean_query,
             retriever=retriever if has_documents else None,
             has_documents=has_documents
         )
 
-        history = ChatHistory(
-            user_id=user_id,
-            query=clean_query,
-            answer=result["answer"],
-            sources=json.dumps(result["sources"]),
-            agent_logs=json.dumps(result["agent_logs"])
+        # Save history after the response is sent
+        background_tasks.add_task(
+            save_history,
+            user_id, clean_query, result["answer"], result["sources"], result["agent_logs"]
         )
-        db.add(history)
-        db.commit()
 
         return QueryResponse(
             query=result["query"],
@@ -139,32 +241,115 @@ async def query(
         raise HTTPException(status_code=500, detail=f"Pipeline failed: {str(e)}")
 
 
+@router.post("/query/stream")
+@limiter.limit("20/minute")
+async def query_stream(
+    request: Request,
+    body: QueryRequest,
+    background_tasks: BackgroundTasks,
+    token: dict = Depends(verify_token)
+):
+    user_id = get_user_id(token)
+    set_cache_owner(user_id)
+
+    # Validate and sanitize query
+    clean_query = validate_query(body.query)
+
+    try:
+        from main import get_user_retriever
+        retriever = await get_user_retriever(user_id)
+        has_documents = body.use_documents and retriever.is_ready()
+
+        state = await run_review_pipeline(
+            query=clean_query,
+            retriever=retriever if has_documents else None,
+            has_documents=has_documents
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pipeline failed: {str(e)}")
+
+    synthesizer = SynthesizerAgent()
+    factchecker_output = state["factchecker_output"]
+    sources = synthesizer.build_sources(factchecker_output.get("reliable_summaries", []))
+    agent_logs = state["agent_logs"]
+    agent_logs.append("Synthesizer: generating final answer")
+    parts = []
+    # Set once the done event is sent; an error or a client disconnect
+    # leaves a partial answer that shouldn't be saved as history
+    completed = False
+
+    async def event_stream():
+        nonlocal completed
+        # Sources and logs first, then the answer as it is generated
+        yield _sse({"type": "sources", "sources": sources, "agent_logs": agent_logs})
+        try:
+            async for delta in synthesizer.astream(factchecker_output):
+                parts.append(delta)
+                yield _sse({"type": "delta", "delta": delta})
+        except Exception as e:
+            yield _sse({"type": "error", "message": f"Synthesis failed: {str(e)}"})
+            return
+        agent_logs.append("Synthesizer: final answer ready")
+        yield _sse({"type": "done", "status": "complete"})
+        completed = True
+
+    async def save_streamed_history():
+        # Runs after the stream has been fully sent
+        answer = "".join(parts).strip()
+        if completed and answer:
+            await save_history(user_id, clean_query, answer, sources, agent_logs)
+
+    background_tasks.add_task(save_streamed_history)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks
+    )
+
+
 @router.get("/history")
 @limiter.limit("30/minute")
 async def get_history(
     request: Request,
-    limit: int = 20,
+    response: Response,
+    limit: int = Query(20, ge=1),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     token: dict = Depends(verify_token)
 ):
     user_id = get_user_id(token)
-
-    # Cap limit
     limit = min(limit, 50)
 
-    history = db.query(ChatHistory)\
-        .filter(ChatHistory.user_id == user_id)\
-        .order_by(ChatHistory.created_at.desc())\
-        .limit(limit)\
-        .all()
+    # Keyset pagination — pass the previous page's X-Next-Cursor as ?cursor=.
+    # The cursor is "<created_at>_<id>" so rows sharing a timestamp aren't skipped.
+    q = db.query(ChatHistory).filter(ChatHistory.user_id == user_id)
+    if cursor:
+        try:
+            cursor_time, cursor_id = cursor.rsplit("_", 1)
+            cursor_time, cursor_id = datetime.fromisoformat(cursor_time), int(cursor_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        q = q.filter(or_(
+            ChatHistory.created_at < cursor_time,
+            and_(ChatHistory.created_at == cursor_time, ChatHistory.id < cursor_id)
+        ))
+    history = q.order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc()).limit(limit).all()
+
+    if len(history) == limit:
+        last = history[-1]
+        response.headers["X-Next-Cursor"] = f"{last.created_at.isoformat()}_{last.id}"
 
     return [
         {
             "id": h.id,
             "query": h.query,
             "answer": h.answer,
-            "sources": json.loads(h.sources) if h.sources else [],
-            "agent_logs": json.loads(h.agent_logs) if h.agent_logs else [],
+            "sources": unpack_json(h.sources) or [],
+            "agent_logs": unpack_json(h.agent_logs) or [],
             "created_at": h.created_at.isoformat()
         }
         for h in history
@@ -203,20 +388,24 @@ async def delete_account(
             .delete()
         db.commit()
 
-        # Delete vector store and uploaded files
-        from main import get_user_retriever, user_retrievers
-        if user_id in user_retrievers:
-            retriever = user_retrievers[user_id]
-            retriever.vector_store.clear()
-            del user_retrievers[user_id]
+        # Delete vector store, cached document text and uploaded files
+        from main import locked_user_retriever, user_retrievers
+        async with locked_user_retriever(user_id) as retriever:
+            user_retrievers.pop(user_id, None)
+            await asyncio.to_thread(_purge_user_documents, retriever, user_id)
+            with retriever.lock:
+                retriever.vector_store.clear()
 
-        upload_dir = get_user_upload_dir(user_id)
-        if os.path.exists(upload_dir):
-            shutil.rmtree(upload_dir)
+            upload_dir = get_user_upload_dir(user_id)
+            if os.path.exists(upload_dir):
+                shutil.rmtree(upload_dir)
 
-        user_data_dir = os.path.join(BASE_DIR, "data", "users", user_id)
-        if os.path.exists(user_data_dir):
-            shutil.rmtree(user_data_dir)
+            user_data_dir = os.path.join(BASE_DIR, "data", "users", user_id)
+            if os.path.exists(user_data_dir):
+                shutil.rmtree(user_data_dir)
+
+        # Cached LLM answers can quote the user's documents
+        await asyncio.to_thread(llm_cache.delete_user, user_id)
 
         return {"message": "Account deleted successfully"}
 
@@ -241,20 +430,21 @@ async def clear_documents(
     user_id = get_user_id(token)
 
     try:
-        from main import get_user_retriever, user_retrievers
-        retriever = get_user_retriever(user_id)
+        from main import locked_user_retriever, user_retrievers
+        async with locked_user_retriever(user_id) as retriever:
+            await asyncio.to_thread(_purge_user_documents, retriever, user_id)
 
-        retriever.vector_store.clear()
-        retriever.bm25 = None
-        retriever.chunks = []
+            with retriever.lock:
+                retriever.vector_store.clear()
+                retriever.bm25 = None
+                retriever.chunks = []
 
-        if user_id in user_retrievers:
-            del user_retrievers[user_id]
+            user_retrievers.pop(user_id, None)
 
-        upload_dir = get_user_upload_dir(user_id)
-        if os.path.exists(upload_dir):
-            shutil.rmtree(upload_dir)
-            os.makedirs(upload_dir, exist_ok=True)
+            upload_dir = get_user_upload_dir(user_id)
+            if os.path.exists(upload_dir):
+                shutil.rmtree(upload_dir)
+                os.makedirs(upload_dir, exist_ok=True)
 
         return {"message": "All documents cleared successfully"}
 
@@ -278,32 +468,14 @@ async def delete_single_document(
         if not os.path.exists(file_path):
             raise HTTPException(status_code=404, detail="Document not found")
 
-        # Remove the file
+        # Remove the file and its cached parse
+        cache_dir = get_user_pdf_cache_dir(user_id)
+        await asyncio.to_thread(forget_cached_pdf, file_path, cache_dir)
         os.remove(file_path)
 
-        # Rebuild retriever from remaining files
-        from main import get_user_retriever, user_retrievers
-        if user_id in user_retrievers:
-            del user_retrievers[user_id]
-
-        retriever = get_user_retriever(user_id)
-        remaining_files = [
-            f for f in os.listdir(upload_dir) if f.endswith(".pdf")
-        ]
-
-        if remaining_files:
-            from utils.pdf_parser import parse_pdf
-            all_chunks = []
-            for f in remaining_files:
-                chunks = parse_pdf(os.path.join(upload_dir, f))
-                all_chunks.extend(chunks)
-            retriever.index_chunks(all_chunks)
-            retriever.vector_store.save()
-        else:
-            # No docs left — clear vector store
-            retriever.vector_store.clear()
-            retriever.bm25 = None
-            retriever.chunks = []
+        from main import locked_user_retriever
+        async with locked_user_retriever(user_id) as retriever:
+            await asyncio.to_thread(_remove_document, retriever, upload_dir, filename, cache_dir)
 
         return {"message": f"{filename} removed successfully"}
 
@@ -317,23 +489,11 @@ class FollowUpRequest(BaseModel):
     original_answer: str
     followup_question: str
 
-@router.post("/followup")
-@limiter.limit("30/minute")
-async def followup(
-    request: Request,
-    body: FollowUpRequest,
-    token: dict = Depends(verify_token)
-):
-    followup_q = validate_query(body.followup_question)
-
-    prompt = f"""You are an expert research assistant with deep analytical capabilities. A user conducted a research query and received a comprehensive answer. They now have a follow-up question that requires thoughtful, accurate, and detailed response.
-
-Original Research Query: {body.original_query}
-
-Research Answer:
-{body.original_answer}
+FOLLOWUP_MODEL = "llama-3.3-70b-versatile"
 
-Follow-up Question: {followup_q}
+# Static instructions come first and the user's question last, so the prompt
+# prefix stays identical across follow-ups on the same research thread.
+FOLLOWUP_INSTRUCTIONS = """You are an expert research assistant with deep analytical capabilities. A user conducted a research query and received a comprehensive answer. They now have a follow-up question that requires thoughtful, accurate, and detailed response.
 
 Instructions:
 - If the follow-up asks for MORE DETAIL on something from the answer, expand on it thoroughly with specific facts, examples, data points, and nuance
@@ -347,15 +507,59 @@ Instructions:
 - Never make up facts — if you don't know something with confidence, say so
 
 Respond in a way that makes the user feel they are talking to a world-class researcher who genuinely understands the topic."""
+
+
+def build_followup_prompt(body: FollowUpRequest, followup_q: str) -> str:
+    return f"""{FOLLOWUP_INSTRUCTIONS}
+
+Original Research Query: {body.original_query}
+
+Research Answer:
+{body.original_answer}
+
+Follow-up Question: {followup_q}"""
+
+
+@router.post("/followup")
+@limiter.limit("30/minute")
+async def followup(
+    request: Request,
+    body: FollowUpRequest,
+    token: dict = Depends(verify_token)
+):
+    set_cache_owner(get_user_id(token))
+    followup_q = validate_query(body.followup_question)
+    prompt = build_followup_prompt(body, followup_q)
+
     try:
-        from langchain_groq import ChatGroq
-        import os
-        llm = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.4
-        )
-        response = llm.invoke(prompt)
-        return {"answer": response.content}
+        answer = await call(FOLLOWUP_MODEL, prompt, temperature=0.4)
+        return {"answer": answer}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Follow-up failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Follow-up failed: {str(e)}")
+
+
+@router.post("/followup/stream")
+@limiter.limit("30/minute")
+async def followup_stream(
+    request: Request,
+    body: FollowUpRequest,
+    token: dict = Depends(verify_token)
+):
+    set_cache_owner(get_user_id(token))
+    followup_q = validate_query(body.followup_question)
+    prompt = build_followup_prompt(body, followup_q)
+
+    async def event_stream():
+        try:
+            async for delta in stream(FOLLOWUP_MODEL, prompt, temperature=0.4):
+                yield _sse({"type": "delta", "delta": delta})
+        except Exception as e:
+            yield _sse({"type": "error", "message": f"Follow-up failed: {str(e)}"})
+            return
+        yield _sse({"type": "done", "status": "complete"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
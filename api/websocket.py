@@ -1,73 +1,144 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from core.firebase_auth import verify_token, get_user_id
-import json
+from core.firebase_auth import verify_token, verify_id_token_cached, get_user_id
+from core.history import save_history
+from core.llm import set_cache_owner
+from core.security import validate_query
+from agents.searcher import SearcherAgent
+from agents.summarizer import SummarizerAgent
+from agents.reviewer import ReviewAgent
+from agents.synthesizer import SynthesizerAgent
+import orjson
 import asyncio
+import logging
 import time
-from concurrent.futures import ThreadPoolExecutor
 
 ws_router = APIRouter()
-executor = ThreadPoolExecutor(max_workers=4)
+logger = logging.getLogger(__name__)
+
+# Stateless agents are shared across connections; the Searcher is bound
+# to each user's retriever per query.
+summarizer = SummarizerAgent()
+reviewer = ReviewAgent()
+synthesizer = SynthesizerAgent()
 
 # --- Per-user rate limiting ---
-# Stores {user_id: [timestamp1, timestamp2, ...]}
-user_query_times = {}
+# Token bucket per user: {user_id: (tokens, last_refill)}, split into shards
+# that each have their own lock so checks for different users don't contend
+RATE_LIMIT_SHARDS = 16
+user_buckets = [({}, asyncio.Lock()) for _ in range(RATE_LIMIT_SHARDS)]
 MAX_QUERIES_PER_MINUTE = 10
+REFILL_PER_SECOND = MAX_QUERIES_PER_MINUTE / 60
+BUCKET_SWEEP_INTERVAL = 300  # seconds
+BUCKET_IDLE_TTL = 600  # seconds
 
 
-def is_rate_limited(user_id: str) -> bool:
-    now = time.time()
-    window = 60  # 1 minute window
+async def is_rate_limited(user_id: str) -> bool:
+    buckets, lock = user_buckets[hash(user_id) % RATE_LIMIT_SHARDS]
+    async with lock:
+        now = time.monotonic()
+        tokens, last = buckets.get(user_id, (MAX_QUERIES_PER_MINUTE, now))
+        tokens = min(MAX_QUERIES_PER_MINUTE, tokens + (now - last) * REFILL_PER_SECOND)
 
-    if user_id not in user_query_times:
-        user_query_times[user_id] = []
+        if tokens < 1:
+            buckets[user_id] = (tokens, now)
+            return True
 
-    # Remove timestamps older than 1 minute
-    user_query_times[user_id] = [
-        t for t in user_query_times[user_id]
-        if now - t < window
-    ]
+        buckets[user_id] = (tokens - 1, now)
+        return False
 
-    if len(user_query_times[user_id]) >= MAX_QUERIES_PER_MINUTE:
-        return True
 
-    user_query_times[user_id].append(now)
-    return False
+async def sweep_rate_limits():
+    """
+    Periodically drop buckets idle long enough to have refilled completely.
+    """
+    while True:
+        await asyncio.sleep(BUCKET_SWEEP_INTERVAL)
+        cutoff = time.monotonic() - BUCKET_IDLE_TTL
+        for buckets, lock in user_buckets:
+            async with lock:
+                for user_id in [u for u, (_, last) in buckets.items() if last < cutoff]:
+                    del buckets[user_id]
 
 
 async def get_user_from_ws_token(token: str) -> str:
     try:
-        from firebase_admin import auth
-        decoded = auth.verify_id_token(token)
+        decoded = await verify_id_token_cached(token)
         return decoded.get("uid", "")
     except Exception:
         return ""
 
 
-async def stream_pipeline(websocket: WebSocket, query: str, has_documents: bool, retriever, user_id: str):
+# --- Outgoing frames ---
+# Progress messages are queued and a per-connection writer sends them.
+# Messages queued back-to-back go out together as one JSON array frame;
+# a lone message is still sent as a single object.
+SEND_QUEUE_SIZE = 64
+MAX_MESSAGES_PER_FRAME = 16
+
+
+def dumps(value) -> str:
+    # Text frames, not send_bytes: browsers hand binary frames to onmessage
+    # as Blobs, which would break the client's JSON.parse
+    return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+
+def make_message(agent: str, status: str, message: str, data: dict = None) -> dict:
+    return {
+        "agent": agent,
+        "status": status,
+        "message": message,
+        "data": data or {}
+    }
+
+
+async def ws_writer(websocket: WebSocket, out_queue: asyncio.Queue):
+    while True:
+        batch = [await out_queue.get()]
+        while not out_queue.empty() and len(batch) < MAX_MESSAGES_PER_FRAME:
+            batch.append(out_queue.get_nowait())
+        await websocket.send_text(dumps(batch[0] if len(batch) == 1 else batch))
+
+
+def raise_writer_error(writer: asyncio.Task):
+    """
+    Raise if the writer has stopped: a failed send means the client is gone,
+    and nothing queued after it would ever be delivered.
+    """
+    if not writer.done():
+        return
+    if writer.cancelled():
+        raise WebSocketDisconnect()
+    raise writer.exception() or WebSocketDisconnect()
+
+
+async def enqueue(out_queue: asyncio.Queue, writer: asyncio.Task, message: dict):
+    raise_writer_error(writer)
+    if not out_queue.full():
+        out_queue.put_nowait(message)
+        return
+
+    # Blocks only when the client falls SEND_QUEUE_SIZE messages behind;
+    # stop waiting if the writer dies meanwhile
+    put = asyncio.ensure_future(out_queue.put(message))
+    await asyncio.wait({put, writer}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        raise_writer_error(writer)
+
 
-    loop = asyncio.get_event_loop()
+async def stream_pipeline(out_queue: asyncio.Queue, writer: asyncio.Task, query: str, has_documents: bool, retriever, user_id: str):
 
     async def send(agent: str, status: str, message: str, data: dict = None):
-        payload = {
-            "agent": agent,
-            "status": status,
-            "message": message,
-            "data": data or {}
-        }
-        await websocket.send_text(json.dumps(payload))
-        await asyncio.sleep(0.05)
+        await enqueue(out_queue, writer, make_message(agent, status, message, data))
 
     try:
-        print(f"Pipeline starting for query: {query}")
+        logger.info("Pipeline starting for query: %s", query)
         await send("System", "started", f"Starting research pipeline for: {query}")
 
         # --- Searcher ---
         await send("Searcher", "thinking", "Searching web and documents for relevant sources...")
-        from agents.searcher import SearcherAgent
         searcher = SearcherAgent(retriever=retriever if has_documents else None)
-        searcher_output = await loop.run_in_executor(
-            executor, lambda: searcher.run(query=query, has_documents=has_documents)
-        )
+        searcher_output = await searcher.arun(query=query, has_documents=has_documents)
         await send("Searcher", "done",
             f"Found {searcher_output['total_results']} relevant sources",
             {"total_results": searcher_output["total_results"],
@@ -76,36 +147,21 @@ async def stream_pipeline(websocket: WebSocket, query: str, has_documents: bool,
 
         # --- Summarizer ---
         await send("Summarizer", "thinking", "Summarizing each source...")
-        from agents.summarizer import SummarizerAgent
-        summarizer = SummarizerAgent()
-        summarizer_output = await loop.run_in_executor(
-            executor, lambda: summarizer.run(searcher_output)
-        )
+        summarizer_output = await summarizer.arun(searcher_output)
         await send("Summarizer", "done",
             f"Created {summarizer_output['total_summaries']} summaries",
             {"total_summaries": summarizer_output["total_summaries"]}
         )
 
-        # --- Critic ---
+        # --- Critic + Fact Checker (single review call) ---
         await send("Critic", "thinking", "Reviewing summaries for quality and bias...")
-        from agents.critic import CriticAgent
-        critic = CriticAgent()
-        critic_output = await loop.run_in_executor(
-            executor, lambda: critic.run(summarizer_output)
-        )
+        await send("FactChecker", "thinking", "Cross-verifying claims across sources...")
+        critic_output, factchecker_output = await reviewer.arun(summarizer_output)
         await send("Critic", "done",
             f"{critic_output['total_reliable']}/{critic_output['total_critiqued']} summaries passed",
             {"total_reliable": critic_output["total_reliable"],
              "total_critiqued": critic_output["total_critiqued"]}
         )
-
-        # --- Fact Checker ---
-        await send("FactChecker", "thinking", "Cross-verifying claims across sources...")
-        from agents.factchecker import FactCheckerAgent
-        factchecker = FactCheckerAgent()
-        factchecker_output = await loop.run_in_executor(
-            executor, lambda: factchecker.run(critic_output)
-        )
         await send("FactChecker", "done",
             f"{len(factchecker_output['verified_claims'])} verified, {len(factchecker_output['disputed_claims'])} disputed",
             {"verified": len(factchecker_output["verified_claims"]),
@@ -114,31 +170,13 @@ async def stream_pipeline(websocket: WebSocket, query: str, has_documents: bool,
 
         # --- Synthesizer ---
         await send("Synthesizer", "thinking", "Generating final structured answer...")
-        from agents.synthesizer import SynthesizerAgent
-        synthesizer = SynthesizerAgent()
-        final_output = await loop.run_in_executor(
-            executor, lambda: synthesizer.run(factchecker_output)
-        )
+        final_output = await synthesizer.arun(factchecker_output)
         await send("Synthesizer", "done", "Final answer ready",
             {"answer_length": len(final_output["answer"])}
         )
 
-        # --- Save to database ---
-        try:
-            from core.database import SessionLocal, ChatHistory
-            db = SessionLocal()
-            history = ChatHistory(
-                user_id=user_id,
-                query=query,
-                answer=final_output["answer"],
-                sources=json.dumps(final_output["sources"]),
-                agent_logs=json.dumps([])
-            )
-            db.add(history)
-            db.commit()
-            db.close()
-        except Exception as e:
-            print(f"Failed to save history: {e}")
+        # --- Save to database (written in the background) ---
+        await save_history(user_id, query, final_output["answer"], final_output["sources"], [])
 
         # --- Final result ---
         await send("System", "complete", "Research complete!", {
@@ -149,84 +187,81 @@ async def stream_pipeline(websocket: WebSocket, query: str, has_documents: bool,
         })
 
     except Exception as e:
-        print(f"Pipeline error: {e}")
+        if writer.done():
+            # The client left; skip the remaining stages and the history save
+            raise
+        logger.error("Pipeline error: %s", e)
         await send("System", "error", f"Pipeline error: {str(e)}")
 
 
 @ws_router.websocket("/ws/query")
 async def websocket_query(websocket: WebSocket):
     await websocket.accept()
-    print("WebSocket client connected")
+    logger.info("WebSocket client connected")
 
     token = websocket.query_params.get("token", "")
     user_id = await get_user_from_ws_token(token)
 
     if not user_id:
-        await websocket.send_text(json.dumps({
-            "agent": "System",
-            "status": "error",
-            "message": "Unauthorized. Please login again.",
-            "data": {}
-        }))
+        await websocket.send_text(dumps(
+            make_message("System", "error", "Unauthorized. Please login again.")
+        ))
         await websocket.close()
         return
 
-    print(f"Authenticated WebSocket for user {user_id[:8]}...")
+    logger.info("Authenticated WebSocket for user %s...", user_id[:8])
+    set_cache_owner(user_id)
+
+    out_queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+    writer = asyncio.create_task(ws_writer(websocket, out_queue))
 
     try:
         while True:
             data = await websocket.receive_text()
-            payload = json.loads(data)
+            payload = orjson.loads(data)
 
             query = payload.get("query", "").strip()
             use_documents = payload.get("use_documents", True)
 
             if not query:
-                await websocket.send_text(json.dumps({
-                    "agent": "System",
-                    "status": "error",
-                    "message": "Query cannot be empty",
-                    "data": {}
-                }))
+                await enqueue(out_queue, writer, make_message("System", "error", "Query cannot be empty"))
                 continue
 
             # --- Rate limit check ---
-            if is_rate_limited(user_id):
-                await websocket.send_text(json.dumps({
-                    "agent": "System",
-                    "status": "error",
-                    "message": f"Rate limit exceeded. Maximum {MAX_QUERIES_PER_MINUTE} queries per minute allowed.",
-                    "data": {}
-                }))
+            if await is_rate_limited(user_id):
+                await enqueue(out_queue, writer, make_message(
+                    "System", "error",
+                    f"Rate limit exceeded. Maximum {MAX_QUERIES_PER_MINUTE} queries per minute allowed."
+                ))
                 continue
 
             # --- Validate query ---
             try:
-                from core.security import validate_query
                 query = validate_query(query)
             except Exception as e:
-                await websocket.send_text(json.dumps({
-                    "agent": "System", "status": "error",
-                    "message": str(e), "data": {}
-                }))
+                await enqueue(out_queue, writer, make_message("System", "error", str(e)))
                 continue
 
             from main import get_user_retriever
-            retriever = get_user_retriever(user_id)
+            retriever = await get_user_retriever(user_id)
             has_documents = use_documents and retriever.is_ready()
 
-            await stream_pipeline(websocket, query, has_documents, retriever, user_id)
+            await stream_pipeline(out_queue, writer, query, has_documents, retriever, user_id)
 
     except WebSocketDisconnect:
-        print(f"WebSocket disconnected for user {user_id[:8]}...")
+        logger.info("WebSocket disconnected for user %s...", user_id[:8])
     except Exception as e:
-        print(f"WebSocket error: {e}")
+        logger.error("WebSocket error: %s", e)
+        writer.cancel()
         try:
-            await websocket.send_text(json.dumps({
-                "agent": "System",
-                "status": "error",
-                "message": str(e),
-                "data": {}
-            }))
+            await websocket.send_text(dumps(make_message("System", "error", str(e))))
         except:
-            pass
\ No newline at end of file
+            pass
+    finally:
+        writer.cancel()
+        try:
+            await writer
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info("WebSocket writer stopped for user %s...: %s", user_id[:8], e)
@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, Index, LargeBinary, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from typing import Any, Optional, Union
+import orjson
 import os
+import threading
+import zstandard as zstd
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -12,9 +16,22 @@ DATABASE_URL = f"sqlite:///{os.path.join(DATA_DIR, 'researchmind.db')}"
 
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False},
+    pool_size=10,
+    max_overflow=10
 )
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _):
+    # WAL lets readers run during writes; NORMAL fsyncs only at checkpoints
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+    cursor.close()
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -23,13 +40,17 @@ Base = declarative_base()
 
 class ChatHistory(Base):
     __tablename__ = "chat_history"
+    __table_args__ = (
+        # Covers the per-user, newest-first history listing
+        Index("ix_history_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(String(128), nullable=False, index=True)  # Firebase UID
     query = Column(Text, nullable=False)
     answer = Column(Text, nullable=False)
-    sources = Column(Text, nullable=True)
-    agent_logs = Column(Text, nullable=True)
+    sources = Column(LargeBinary, nullable=True)  # zstd-compressed JSON, see pack_json
+    agent_logs = Column(LargeBinary, nullable=True)  # zstd-compressed JSON, see pack_json
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -46,11 +67,70 @@ class UploadedDocument(Base):
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
 
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # blake2b(llm params + prompt)
+    response = Column(Text, nullable=False)
+    # User whose request produced the entry, so it can go with their account
+    user_id = Column(String(128), nullable=True, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+# --- JSON column encoding ---
+
+ZSTD_LEVEL = 3
+
+# zstd contexts are not safe to share between threads
+_zstd = threading.local()
+
+
+def _compressor() -> zstd.ZstdCompressor:
+    if not hasattr(_zstd, "cctx"):
+        _zstd.cctx = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+    return _zstd.cctx
+
+
+def _decompressor() -> zstd.ZstdDecompressor:
+    if not hasattr(_zstd, "dctx"):
+        _zstd.dctx = zstd.ZstdDecompressor()
+    return _zstd.dctx
+
+
+def pack_json(value: Any) -> bytes:
+    """
+    Serialize to JSON and zstd-compress for a LargeBinary column.
+    """
+    return _compressor().compress(orjson.dumps(value))
+
+
+def unpack_json(value: Optional[Union[bytes, str]]) -> Any:
+    """
+    Inverse of pack_json. Also accepts rows stored as plain JSON text
+    before compression was introduced.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        return orjson.loads(value)
+    return orjson.loads(_decompressor().decompress(value))
+
+
 # --- Helper functions ---
 
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
+    # create_all skips columns and indexes on tables that already exist
+    with engine.begin() as conn:
+        columns = {row.name for row in conn.execute(text("PRAGMA table_info(llm_cache)"))}
+        if "user_id" not in columns:
+            conn.execute(text("ALTER TABLE llm_cache ADD COLUMN user_id VARCHAR(128)"))
+
+    for table in (ChatHistory.__table__, LLMCacheEntry.__table__):
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
 
 def get_db():
     db = SessionLocal()
@@ -60,6 +140,34 @@ def get_db():
         db.close()
 
 
+def migrate_history_encoding():
+    """
+    One-time re-encode of chat history rows written as plain JSON text.
+    SQLite columns are dynamically typed, so no ALTER TABLE is needed.
+    """
+    with engine.begin() as conn:
+        rows = conn.execute(text(
+            "SELECT id, sources, agent_logs FROM chat_history "
+            "WHERE typeof(sources) = 'text' OR typeof(agent_logs) = 'text'"
+        )).fetchall()
+        if not rows:
+            return
+
+        conn.execute(
+            text("UPDATE chat_history SET sources = :sources, agent_logs = :agent_logs WHERE id = :id"),
+            [
+                {
+                    "id": row.id,
+                    "sources": pack_json(unpack_json(row.sources) or []),
+                    "agent_logs": pack_json(unpack_json(row.agent_logs) or [])
+                }
+                for row in rows
+            ]
+        )
+    print(f"✅ Compressed {len(rows)} chat history rows")
+
+
 def init_db():
     create_tables()
+    migrate_history_encoding()
     print("✅ Database initialized")
\ No newline at end of file
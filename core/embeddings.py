@@ -1,4 +1,8 @@
 import os
+import hashlib
+import diskcache
+import numpy as np
+import torch
 from typing import List
 from dotenv import load_dotenv
 from sentence_transformers import SentenceTransformer
@@ -10,30 +14,174 @@ hf_token = os.getenv("HUGGINGFACE_TOKEN")
 if hf_token:
     os.environ["HUGGINGFACE_HUB_TOKEN"] = hf_token
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
 MODEL_NAME = "all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = 128
+MAX_SEQ_LENGTH = 256  # matches the sentence-transformers config for MiniLM
 model = None
+model_backend = None
+
+# On-disk LRU of embeddings keyed by text hash, stored as float16
+EMBED_CACHE_DIR = os.path.join(BASE_DIR, "data", "emb_cache")
+EMBED_CACHE_SIZE_LIMIT = 1 << 30  # 1GB
+embed_cache = None
+
+# "onnx" runs the int8-quantized ONNX export of the model through ONNX
+# Runtime; "torch" runs the FP32 PyTorch model. ONNX falls back to torch
+# if onnxruntime isn't installed.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx").lower()
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+ORT_NUM_THREADS = int(os.getenv("ORT_NUM_THREADS", max(1, (os.cpu_count() or 2) // 2)))
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", max(1, (os.cpu_count() or 2) // 2)))
 
+# Leave cores for the event loop's worker threads when running on PyTorch
+torch.set_num_threads(TORCH_NUM_THREADS)
 
-def get_model() -> SentenceTransformer:
+
+class OnnxEmbedder:
+    """
+    Minimal stand-in for SentenceTransformer.encode on top of ONNX Runtime:
+    tokenize, run the quantized model, mean-pool, L2-normalize.
+    """
+
+    def __init__(self, repo_id: str):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(repo_id)
+
+        options = ort.SessionOptions()
+        # Leave cores for the event loop's worker threads
+        options.intra_op_num_threads = ORT_NUM_THREADS
+        self.session = ort.InferenceSession(
+            hf_hub_download(repo_id, ONNX_MODEL_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dimension = None
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = False, **_) -> np.ndarray:
+        single = isinstance(texts, str)
+        if single:
+            texts = [texts]
+
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True, truncation=True, max_length=MAX_SEQ_LENGTH, return_tensors="np"
+            )
+            feeds = {k: v.astype(np.int64) for k, v in tokens.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            # Mean pooling over non-padding tokens
+            mask = tokens["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            batches.append(pooled.astype(np.float32))
+
+        embeddings = np.concatenate(batches) if batches else np.empty((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self.dimension is None:
+            self.dimension = int(self.encode(["dimension probe"]).shape[1])
+        return self.dimension
+
+
+def get_model():
     """
     Load the embedding model (only once).
     """
-    global model
+    global model, model_backend
     if model is None:
-        print(f"Loading embedding model: {MODEL_NAME}...")
-        model = SentenceTransformer(MODEL_NAME)
+        print(f"Loading embedding model: {MODEL_NAME} ({EMBEDDING_BACKEND})...")
+        if EMBEDDING_BACKEND == "onnx":
+            try:
+                model = OnnxEmbedder(f"sentence-transformers/{MODEL_NAME}")
+                model_backend = "onnx"
+            except Exception as e:
+                print(f"⚠️ ONNX backend unavailable ({e}), falling back to PyTorch")
+        if model is None:
+            model = SentenceTransformer(MODEL_NAME)
+            model_backend = "torch"
         print("Model loaded successfully!")
     return model
 
 
+def get_embed_cache() -> diskcache.Cache:
+    global embed_cache
+    if embed_cache is None:
+        embed_cache = diskcache.Cache(EMBED_CACHE_DIR, size_limit=EMBED_CACHE_SIZE_LIMIT)
+    return embed_cache
+
+
+def embed_cache_key(text: str, backend: str = None) -> bytes:
+    # Backends produce slightly different vectors, so never mix them
+    return hashlib.blake2b(
+        f"{backend or model_backend}|{MODEL_NAME}|{text}".encode(), digest_size=16
+    ).digest()
+
+
+def forget_embeddings(texts: List[str]):
+    """
+    Drop cached embeddings of these texts (under either backend), e.g. when
+    the document they came from is deleted.
+    """
+    cache = get_embed_cache()
+    with cache.transact():
+        for text in texts:
+            for backend in ("onnx", "torch"):
+                cache.delete(embed_cache_key(text, backend))
+
+
+def embed_cached(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts, running the model only on those not already cached.
+    Returns float32 vectors in input order.
+    """
+    m = get_model()
+    cache = get_embed_cache()
+    keys = [embed_cache_key(t) for t in texts]
+
+    vectors = [None] * len(texts)
+    misses = []
+    for i, key in enumerate(keys):
+        hit = cache.get(key)
+        if hit is not None:
+            vectors[i] = np.frombuffer(hit, dtype=np.float16)
+        else:
+            misses.append(i)
+
+    if misses:
+        # inference_mode skips autograd bookkeeping entirely on the torch backend
+        with torch.inference_mode():
+            embeddings = m.encode(
+                [texts[i] for i in misses],
+                batch_size=EMBED_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+        with cache.transact():
+            for i, embedding in zip(misses, embeddings):
+                # Return the float16 copy too, so hits and misses agree
+                vectors[i] = embedding.astype(np.float16)
+                cache.set(keys[i], vectors[i].tobytes())
+
+    return np.stack(vectors).astype(np.float32)
+
+
 def embed_text(text: str) -> List[float]:
     """
     Embed a single text string.
     Returns a list of floats (the vector).
     """
-    m = get_model()
-    embedding = m.encode(text, convert_to_numpy=True)
-    return embedding.tolist()
+    return embed_cached([text])[0].tolist()
 
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
@@ -41,9 +189,9 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
     Embed a list of texts in batch (faster than one by one).
     Returns a list of vectors.
     """
-    m = get_model()
-    embeddings = m.encode(texts, convert_to_numpy=True, show_progress_bar=True)
-    return embeddings.tolist()
+    if not texts:
+        return []
+    return embed_cached(texts).tolist()
 
 
 def get_embedding_dimension() -> int:
@@ -2,8 +2,12 @@ import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi import HTTPException, Header
 from typing import Optional
+from cachetools import TTLCache
+import asyncio
+import hashlib
 import os
 import json
+import time
 
 # Initialize Firebase Admin SDK
 if not firebase_admin._apps:
@@ -21,6 +25,43 @@ if not firebase_admin._apps:
     firebase_admin.initialize_app(cred)
 
 
+# Decoded ID tokens, keyed by sha256(token). Firebase tokens live an hour;
+# entries are trusted until TOKEN_EXPIRY_MARGIN seconds before their exp.
+TOKEN_CACHE_SIZE = 10_000
+TOKEN_CACHE_TTL = 3000  # seconds
+TOKEN_EXPIRY_MARGIN = 60  # seconds
+
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+# Sharded so concurrent first requests with one token verify it only once
+_token_locks = [asyncio.Lock() for _ in range(16)]
+
+
+def _cached_token(key: bytes) -> Optional[dict]:
+    decoded = _token_cache.get(key)
+    if decoded and decoded.get("exp", 0) - TOKEN_EXPIRY_MARGIN > time.time():
+        return decoded
+    return None
+
+
+async def verify_id_token_cached(token: str) -> dict:
+    """
+    auth.verify_id_token, memoized per token until shortly before it expires.
+    Verification errors are raised as-is and never cached.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    decoded = _cached_token(key)
+    if decoded:
+        return decoded
+
+    async with _token_locks[key[0] % len(_token_locks)]:
+        decoded = _cached_token(key)
+        if decoded:
+            return decoded
+        decoded = await asyncio.to_thread(auth.verify_id_token, token)
+        _token_cache[key] = decoded
+        return decoded
+
+
 async def verify_token(authorization: Optional[str] = Header(None)) -> dict:
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header missing")
@@ -31,7 +72,7 @@ async def verify_token(authorization: Optional[str] = Header(None)) -> dict:
     token = authorization.replace("Bearer ", "")
 
     try:
-        decoded = auth.verify_id_token(token)
+        decoded = await verify_id_token_cached(token)
         return decoded
     except auth.ExpiredIdTokenError:
         raise HTTPException(status_code=401, detail="Token expired. Please login again.")
@@ -1,16 +1,19 @@
-from typing import TypedDict, List, Dict, Any, Optional
+from typing import TypedDict, Annotated, List, Dict, Any, Optional
 from langgraph.graph import StateGraph, END
 from agents.searcher import SearcherAgent
 from agents.summarizer import SummarizerAgent
-from agents.critic import CriticAgent
-from agents.factchecker import FactCheckerAgent
+from agents.reviewer import ReviewAgent
 from agents.synthesizer import SynthesizerAgent
 from core.retriever import HybridRetriever
 from dotenv import load_dotenv
+import logging
+import operator
 import os
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class ResearchState(TypedDict):
     query: str
@@ -20,81 +23,97 @@ class ResearchState(TypedDict):
     critic_output: Dict
     factchecker_output: Dict
     final_output: Dict
-    agent_logs: List[str]
+    # Nodes return only their new log lines; LangGraph concatenates them
+    agent_logs: Annotated[List[str], operator.add]
     status: str
 
 
-def create_research_graph(retriever: HybridRetriever = None):
+def create_research_graph(retriever: HybridRetriever = None, synthesize: bool = True):
     """
     Create and return the full multi-agent research pipeline.
+    With synthesize=False the graph stops after review, so the caller can
+    stream the final answer itself.
     """
     searcher = SearcherAgent(retriever=retriever)
     summarizer = SummarizerAgent()
-    critic = CriticAgent()
-    factchecker = FactCheckerAgent()
+    reviewer = ReviewAgent()
     synthesizer = SynthesizerAgent()
 
-    def run_searcher(state: ResearchState) -> Dict:
-        print("\n[Graph] Running Searcher Agent...")
-        logs = state.get("agent_logs", [])
-        logs.append("Searcher: searching for relevant sources")
-        output = searcher.run(
+    # Each node returns only the keys it changes; LangGraph merges them into the state
+    async def run_searcher(state: ResearchState) -> Dict:
+        logger.debug("Running Searcher Agent")
+        output = await searcher.arun(
             query=state["query"],
             has_documents=state["has_documents"]
         )
-        logs.append(f"Searcher: found {output['total_results']} results")
-        return {**state, "searcher_output": output, "agent_logs": logs, "status": "searching"}
-
-    def run_summarizer(state: ResearchState) -> Dict:
-        print("\n[Graph] Running Summarizer Agent...")
-        logs = state.get("agent_logs", [])
-        logs.append("Summarizer: summarizing sources")
-        output = summarizer.run(state["searcher_output"])
-        logs.append(f"Summarizer: created {output['total_summaries']} summaries")
-        return {**state, "summarizer_output": output, "agent_logs": logs, "status": "summarizing"}
-
-    def run_critic(state: ResearchState) -> Dict:
-        print("\n[Graph] Running Critic Agent...")
-        logs = state.get("agent_logs", [])
-        logs.append("Critic: reviewing summary quality")
-        output = critic.run(state["summarizer_output"])
-        logs.append(f"Critic: {output['total_reliable']}/{output['total_critiqued']} summaries passed")
-        return {**state, "critic_output": output, "agent_logs": logs, "status": "critiquing"}
-
-    def run_factchecker(state: ResearchState) -> Dict:
-        print("\n[Graph] Running Fact Checker Agent...")
-        logs = state.get("agent_logs", [])
-        logs.append("FactChecker: verifying claims across sources")
-        output = factchecker.run(state["critic_output"])
-        logs.append(f"FactChecker: {len(output['verified_claims'])} verified, {len(output['disputed_claims'])} disputed")
-        return {**state, "factchecker_output": output, "agent_logs": logs, "status": "factchecking"}
-
-    def run_synthesizer(state: ResearchState) -> Dict:
-        print("\n[Graph] Running Synthesizer Agent...")
-        logs = state.get("agent_logs", [])
-        logs.append("Synthesizer: generating final answer")
-        output = synthesizer.run(state["factchecker_output"])
-        logs.append("Synthesizer: final answer ready")
-        return {**state, "final_output": output, "agent_logs": logs, "status": "complete"}
+        return {
+            "searcher_output": output,
+            "agent_logs": [
+                "Searcher: searching for relevant sources",
+                f"Searcher: found {output['total_results']} results"
+            ],
+            "status": "searching"
+        }
+
+    async def run_summarizer(state: ResearchState) -> Dict:
+        logger.debug("Running Summarizer Agent")
+        output = await summarizer.arun(state["searcher_output"])
+        return {
+            "summarizer_output": output,
+            "agent_logs": [
+                "Summarizer: summarizing sources",
+                f"Summarizer: created {output['total_summaries']} summaries"
+            ],
+            "status": "summarizing"
+        }
+
+    async def run_reviewer(state: ResearchState) -> Dict:
+        logger.debug("Running Review Agent")
+        critic_output, factchecker_output = await reviewer.arun(state["summarizer_output"])
+        return {
+            "critic_output": critic_output,
+            "factchecker_output": factchecker_output,
+            "agent_logs": [
+                "Critic: reviewing summary quality",
+                "FactChecker: verifying claims across sources",
+                f"Critic: {critic_output['total_reliable']}/{critic_output['total_critiqued']} summaries passed",
+                f"FactChecker: {len(factchecker_output['verified_claims'])} verified, {len(factchecker_output['disputed_claims'])} disputed"
+            ],
+            "status": "factchecking"
+        }
+
+    async def run_synthesizer(state: ResearchState) -> Dict:
+        logger.debug("Running Synthesizer Agent")
+        output = await synthesizer.arun(state["factchecker_output"])
+        return {
+            "final_output": output,
+            "agent_logs": [
+                "Synthesizer: generating final answer",
+                "Synthesizer: final answer ready"
+            ],
+            "status": "complete"
+        }
 
     graph = StateGraph(ResearchState)
     graph.add_node("searcher", run_searcher)
     graph.add_node("summarizer", run_summarizer)
-    graph.add_node("critic", run_critic)
-    graph.add_node("factchecker", run_factchecker)
-    graph.add_node("synthesizer", run_synthesizer)
+    graph.add_node("reviewer", run_reviewer)
 
     graph.set_entry_point("searcher")
     graph.add_edge("searcher", "summarizer")
-    graph.add_edge("summarizer", "critic")
-    graph.add_edge("critic", "factchecker")
-    graph.add_edge("factchecker", "synthesizer")
-    graph.add_edge("synthesizer", END)
+    graph.add_edge("summarizer", "reviewer")
+
+    if synthesize:
+        graph.add_node("synthesizer", run_synthesizer)
+        graph.add_edge("reviewer", "synthesizer")
+        graph.add_edge("synthesizer", END)
+    else:
+        graph.add_edge("reviewer", END)
 
     return graph.compile()
 
 
-def run_research_pipeline(
+async def run_research_pipeline(
     query: str,
     retriever: HybridRetriever = None,
     has_documents: bool = False
@@ -104,7 +123,31 @@ def run_research_pipeline(
     Returns the complete final output.
     """
     graph = create_research_graph(retriever=retriever)
+    final_state = await graph.ainvoke(_initial_state(query, has_documents))
 
+    return {
+        "query": query,
+        "answer": final_state["final_output"].get("answer", ""),
+        "sources": final_state["final_output"].get("sources", []),
+        "agent_logs": final_state["agent_logs"],
+        "status": final_state["status"]
+    }
+
+
+async def run_review_pipeline(
+    query: str,
+    retriever: HybridRetriever = None,
+    has_documents: bool = False
+) -> ResearchState:
+    """
+    Run the pipeline up to and including review, without synthesis.
+    Returns the final graph state for the caller to synthesize from.
+    """
+    graph = create_research_graph(retriever=retriever, synthesize=False)
+    return await graph.ainvoke(_initial_state(query, has_documents))
+
+
+def _initial_state(query: str, has_documents: bool) -> ResearchState:
     initial_state: ResearchState = {
         "query": query,
         "has_documents": has_documents,
@@ -117,16 +160,6 @@ def run_research_pipeline(
         "status": "starting"
     }
 
-    print(f"\n{'='*60}")
-    print(f"Starting Research Pipeline for: '{query}'")
-    print('='*60)
-
-    final_state = graph.invoke(initial_state)
+    logger.info("Starting Research Pipeline for: '%s'", query)
 
-    return {
-        "query": query,
-        "answer": final_state["final_output"].get("answer", ""),
-        "sources": final_state["final_output"].get("sources", []),
-        "agent_logs": final_state["agent_logs"],
-        "status": final_state["status"]
-    }
\ No newline at end of file
+    return initial_state
\ No newline at end of file
@@ -0,0 +1,116 @@
+from typing import List, Dict
+from sqlalchemy.orm import Session
+from core.database import SessionLocal, ChatHistory, pack_json
+import asyncio
+import logging
+
+# Chat history is written behind the request: callers enqueue and return,
+# and a single consumer commits queued rows in batches so many saves share
+# one transaction (and one fsync).
+HISTORY_QUEUE_SIZE = 1000
+HISTORY_BATCH_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
+history_queue: asyncio.Queue = asyncio.Queue(maxsize=HISTORY_QUEUE_SIZE)
+
+# Queued by stop_history_writer: the writer commits what it already took,
+# then exits instead of waiting for more
+_STOP = object()
+
+
+async def save_history(user_id: str, query: str, answer: str, sources: List[dict], agent_logs: List[str]):
+    """
+    Queue a chat history row for the background writer.
+    """
+    await history_queue.put({
+        "user_id": user_id,
+        "query": query,
+        "answer": answer,
+        "sources": sources,
+        "agent_logs": agent_logs
+    })
+
+
+def write_batch(db: Session, batch: List[Dict]) -> bool:
+    """
+    Commit one batch. Returns False if it failed and the session should be
+    replaced.
+    """
+    try:
+        db.add_all([
+            ChatHistory(
+                user_id=item["user_id"],
+                query=item["query"],
+                answer=item["answer"],
+                sources=pack_json(item["sources"]),
+                agent_logs=pack_json(item["agent_logs"])
+            )
+            for item in batch
+        ])
+        db.commit()
+        # Written rows are never read back; keep the identity map empty
+        db.expunge_all()
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error("Failed to save %d chat history rows: %s", len(batch), e)
+        return False
+
+
+def drain(limit: int = None) -> List[Dict]:
+    batch = []
+    while not history_queue.empty() and (limit is None or len(batch) < limit):
+        item = history_queue.get_nowait()
+        if item is _STOP:
+            # Put it back for the writer and stop this batch here
+            history_queue.put_nowait(item)
+            break
+        batch.append(item)
+    return batch
+
+
+async def history_writer():
+    """
+    Consumer task: commit queued rows in batches of up to HISTORY_BATCH_SIZE.
+    """
+    # One long-lived session for the consumer, replaced only after a failure
+    db = SessionLocal()
+    try:
+        while True:
+            item = await history_queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            batch.extend(drain(HISTORY_BATCH_SIZE - 1))
+            if not await asyncio.to_thread(write_batch, db, batch):
+                db.close()
+                db = SessionLocal()
+    finally:
+        db.close()
+
+
+async def stop_history_writer(writer: asyncio.Task):
+    """
+    Stop the writer after its in-flight batch has committed. Not a cancel:
+    that would close the session while a worker thread is still using it.
+    """
+    if not writer.done():
+        await history_queue.put(_STOP)
+    try:
+        await writer
+    except Exception as e:
+        logger.error("History writer failed: %s", e)
+
+
+async def flush_history():
+    """
+    Write whatever is still queued, e.g. on shutdown.
+    """
+    batch = drain()
+    if batch:
+        db = SessionLocal()
+        try:
+            await asyncio.to_thread(write_batch, db, batch)
+        finally:
+            db.close()
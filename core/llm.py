@@ -0,0 +1,144 @@
+import asyncio
+import httpx
+import orjson
+import os
+import weakref
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+from groq import AsyncGroq
+from core import llm_cache
+
+load_dotenv()
+
+# One client per event loop: an AsyncGroq connection pool cannot be shared
+# across loops, but within the app's loop every agent reuses the same one.
+_clients = weakref.WeakKeyDictionary()
+
+# HTTP/2 lets concurrent agent calls multiplex over a few warm connections
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+# User the current request runs for; their cache entries are tagged with it
+# so they can be dropped when the account is deleted
+_cache_owner: ContextVar[Optional[str]] = ContextVar("llm_cache_owner", default=None)
+
+
+def set_cache_owner(user_id: Optional[str]):
+    _cache_owner.set(user_id)
+
+
+def get_client() -> AsyncGroq:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            http_client=httpx.AsyncClient(
+                http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT
+            )
+        )
+        _clients[loop] = client
+    return client
+
+
+def _cache_key(
+    model: str,
+    prompt: str,
+    temperature: float,
+    max_tokens: Optional[int],
+    json_mode: bool
+) -> str:
+    llm_string = f"{model}|{temperature}|{max_tokens}|{json_mode}"
+    return llm_cache.make_cache_key(llm_string, prompt)
+
+
+async def call(
+    model: str,
+    prompt: str,
+    temperature: float,
+    max_tokens: Optional[int] = None,
+    json_mode: bool = False
+) -> str:
+    """
+    Send a single-message chat completion to Groq and return the text.
+    Identical calls are answered from the LLM cache.
+    """
+    key = _cache_key(model, prompt, temperature, max_tokens, json_mode)
+
+    cached = await asyncio.to_thread(llm_cache.lookup, key)
+    if cached is not None:
+        return cached
+
+    kwargs = {}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+    if json_mode:
+        kwargs["response_format"] = {"type": "json_object"}
+
+    response = await get_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+        **kwargs
+    )
+    choice = response.choices[0]
+    text = choice.message.content or ""
+
+    # Don't pin a truncated or unparseable answer in the cache; the caller
+    # falls back this once, and the next identical call gets a fresh try
+    if choice.finish_reason != "length" and (not json_mode or _is_json(text)):
+        await asyncio.to_thread(llm_cache.update, key, text, _cache_owner.get())
+    return text
+
+
+def _is_json(text: str) -> bool:
+    try:
+        orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return False
+    return True
+
+
+async def stream(
+    model: str,
+    prompt: str,
+    temperature: float,
+    max_tokens: Optional[int] = None
+) -> AsyncIterator[str]:
+    """
+    Stream a single-message chat completion from Groq, yielding text deltas
+    as they arrive. The assembled text is cached once the stream completes.
+    """
+    key = _cache_key(model, prompt, temperature, max_tokens, False)
+
+    cached = await asyncio.to_thread(llm_cache.lookup, key)
+    if cached is not None:
+        yield cached
+        return
+
+    kwargs = {}
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+
+    response = await get_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+        stream=True,
+        **kwargs
+    )
+
+    parts = []
+    finish_reason = None
+    async for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+        if delta:
+            parts.append(delta)
+            yield delta
+
+    if finish_reason != "length":
+        await asyncio.to_thread(llm_cache.update, key, "".join(parts), _cache_owner.get())
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import text
+from core.database import SessionLocal, LLMCacheEntry
+
+# Entries expire so sampled (temperature > 0) generations are not replayed
+# forever, and the table is trimmed to the newest LLM_CACHE_MAX_ROWS
+LLM_CACHE_TTL = timedelta(seconds=int(os.getenv("LLM_CACHE_TTL", 24 * 3600)))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", 10000))
+LLM_CACHE_PRUNE_EVERY = 100  # writes between prunes
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def make_cache_key(llm_string: str, prompt: str) -> str:
+    """
+    Content-addressed key for an LLM call.
+    llm_string carries the model name, temperature, max_tokens etc.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(llm_string.encode())
+    digest.update(b"|")
+    digest.update(prompt.encode())
+    return digest.hexdigest()
+
+
+def lookup(key: str) -> Optional[str]:
+    """
+    Return the cached response text for a key, or None on a miss.
+    """
+    db = SessionLocal()
+    try:
+        entry = db.get(LLMCacheEntry, key)
+        if entry is None or entry.created_at < datetime.utcnow() - LLM_CACHE_TTL:
+            return None
+        return entry.response
+    except Exception as e:
+        print(f"  ⚠️ LLM cache lookup failed: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def update(key: str, response: str, user_id: Optional[str] = None):
+    global _writes
+    db = SessionLocal()
+    try:
+        db.merge(LLMCacheEntry(
+            key=key, response=response, user_id=user_id, created_at=datetime.utcnow()
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"  ⚠️ LLM cache write failed: {e}")
+    finally:
+        db.close()
+
+    with _writes_lock:
+        _writes += 1
+        due = _writes % LLM_CACHE_PRUNE_EVERY == 0
+    if due:
+        prune()
+
+
+def prune():
+    """
+    Delete expired entries, then everything but the newest LLM_CACHE_MAX_ROWS.
+    """
+    db = SessionLocal()
+    try:
+        db.query(LLMCacheEntry)\
+            .filter(LLMCacheEntry.created_at < datetime.utcnow() - LLM_CACHE_TTL)\
+            .delete()
+        db.execute(
+            text(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET :keep)"
+            ),
+            {"keep": LLM_CACHE_MAX_ROWS}
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"  ⚠️ LLM cache prune failed: {e}")
+    finally:
+        db.close()
+
+
+def delete_user(user_id: str):
+    """
+    Drop every entry produced by one user's requests.
+    """
+    db = SessionLocal()
+    try:
+        db.query(LLMCacheEntry).filter(LLMCacheEntry.user_id == user_id).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def clear():
+    db = SessionLocal()
+    try:
+        db.query(LLMCacheEntry).delete()
+        db.commit()
+    finally:
+        db.close()
@@ -0,0 +1,40 @@
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+_listener = None
+
+
+def start_logging():
+    """
+    Route log records through a queue: request handlers only enqueue, and a
+    background listener thread formats and writes them to stderr.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+
+def stop_logging():
+    """
+    Flush queued records and stop the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,6 +1,13 @@
-from rank_bm25 import BM25Okapi
-from typing import List, Dict
+import bm25s
+import numpy as np
+from itertools import islice
+from typing import Iterable, List, Dict, Optional
 from core.vectorstore import VectorStore
+import threading
+
+# Chunks are embedded and added to FAISS this many at a time, so indexing a
+# large document never holds every embedding in memory at once
+INDEX_BATCH_SIZE = 256
 
 
 class HybridRetriever:
@@ -8,14 +15,57 @@ class HybridRetriever:
         self.vector_store = vector_store
         self.bm25 = None
         self.chunks = []
+        # Indexing and search run in worker threads; FAISS and BM25 must not
+        # be mutated while another thread reads them
+        self.lock = threading.RLock()
 
-    def index_chunks(self, chunks: List[Dict]):
+    def index_chunks(self, chunks: List[Dict], source: Optional[str] = None):
         """
         Index chunks in both FAISS and BM25.
+        If source is given, every chunk is tagged with it so the document
+        can later be removed with delete_by_source.
+        """
+        self.add_many(chunks, source=source)
+
+    def add_many(self, chunks: Iterable[Dict], source: Optional[str] = None) -> int:
+        """
+        Index chunk dicts from any iterable, embedding them in batches of
+        INDEX_BATCH_SIZE. BM25 is refit once at the end.
+        Returns the number of chunks indexed.
         """
-        self.vector_store.add_chunks(chunks)
-        self._build_bm25(chunks)
-        print(f"✅ Hybrid retriever indexed {len(chunks)} chunks")
+        with self.lock:
+            chunks = iter(chunks)
+            total = 0
+            while batch := list(islice(chunks, INDEX_BATCH_SIZE)):
+                if source is not None:
+                    batch = [{**chunk, "source": source} for chunk in batch]
+                self.vector_store.add_chunks(batch)
+                total += len(batch)
+            if total:
+                self._build_bm25(self.vector_store.chunks)
+            print(f"✅ Hybrid retriever indexed {total} chunks")
+            return total
+
+    def delete_by_source(self, source: str) -> int:
+        """
+        Drop all chunks of one document from FAISS and refit BM25 over
+        the remaining chunks. Nothing is re-parsed or re-embedded.
+        """
+        with self.lock:
+            removed = self.vector_store.delete_by_source(source)
+            if removed:
+                if self.vector_store.chunks:
+                    self._build_bm25(self.vector_store.chunks)
+                else:
+                    self.bm25 = None
+                    self.chunks = []
+            return removed
+
+    def has_untagged_chunks(self) -> bool:
+        """
+        True if the index holds chunks saved before per-document source tagging.
+        """
+        return any("source" not in chunk for chunk in self.vector_store.chunks)
 
     def _build_bm25(self, chunks: List[Dict]):
         """
@@ -23,75 +73,82 @@ class HybridRetriever:
         """
         self.chunks = chunks
         tokenized = [chunk["text"].lower().split() for chunk in chunks]
-        self.bm25 = BM25Okapi(tokenized)
+        # bm25s scores through a sparse matrix rather than a per-document loop
+        self.bm25 = bm25s.BM25()
+        self.bm25.index(tokenized, show_progress=False)
 
     def search(self, query: str, top_k: int = 5) -> List[Dict]:
         """
         Hybrid search — combines FAISS semantic + BM25 keyword results.
         Deduplicates and re-ranks by combined score.
         """
-        results = {}
-
-        # --- FAISS semantic search ---
-        faiss_results = self.vector_store.search(query, top_k=top_k)
-        for r in faiss_results:
-            cid = r["chunk_id"]
-            results[cid] = r.copy()
-            results[cid]["faiss_score"] = r["score"]
-            results[cid]["bm25_score"] = 0.0
-
-        # --- BM25 keyword search ---
-        if self.bm25 and self.chunks:
-            tokenized_query = query.lower().split()
-            bm25_scores = self.bm25.get_scores(tokenized_query)
-
-            top_bm25_indices = sorted(
-                range(len(bm25_scores)),
-                key=lambda i: bm25_scores[i],
+        with self.lock:
+            results = {}
+
+            # chunk_id restarts at 0 for every document, so key on (source, chunk_id)
+            # --- FAISS semantic search ---
+            faiss_results = self.vector_store.search(query, top_k=top_k)
+            for r in faiss_results:
+                cid = (r.get("source"), r["chunk_id"])
+                results[cid] = r.copy()
+                results[cid]["faiss_score"] = r["score"]
+                results[cid]["bm25_score"] = 0.0
+
+            # --- BM25 keyword search ---
+            # Terms outside the corpus vocabulary can't score; skip BM25 if none remain
+            tokenized_query = [
+                t for t in query.lower().split() if self.bm25 and t in self.bm25.vocab_dict
+            ]
+            if self.bm25 and self.chunks and tokenized_query:
+                bm25_scores = self.bm25.get_scores(tokenized_query)
+
+                # Partition out the top k in O(n), then order just those
+                k = min(top_k, len(bm25_scores))
+                top_bm25_indices = np.argpartition(-bm25_scores, k - 1)[:k]
+                top_bm25_indices = top_bm25_indices[np.argsort(-bm25_scores[top_bm25_indices])]
+
+                max_bm25 = float(bm25_scores.max()) or 1.0
+
+                for idx in top_bm25_indices:
+                    chunk = self.chunks[idx]
+                    cid = (chunk.get("source"), chunk["chunk_id"])
+                    normalized_score = float(bm25_scores[idx]) / max_bm25
+
+                    if cid in results:
+                        results[cid]["bm25_score"] = normalized_score
+                    else:
+                        entry = chunk.copy()
+                        entry["faiss_score"] = 0.0
+                        entry["bm25_score"] = normalized_score
+                        entry["score"] = normalized_score
+                        results[cid] = entry
+
+            # --- Combine scores (60% semantic + 40% keyword) ---
+            for cid in results:
+                results[cid]["combined_score"] = (
+                    0.6 * results[cid].get("faiss_score", 0) +
+                    0.4 * results[cid].get("bm25_score", 0)
+                )
+
+            sorted_results = sorted(
+                results.values(),
+                key=lambda x: x["combined_score"],
                 reverse=True
             )[:top_k]
 
-            max_bm25 = max(bm25_scores) if max(bm25_scores) > 0 else 1
-
-            for idx in top_bm25_indices:
-                chunk = self.chunks[idx]
-                cid = chunk["chunk_id"]
-                normalized_score = bm25_scores[idx] / max_bm25
-
-                if cid in results:
-                    results[cid]["bm25_score"] = normalized_score
-                else:
-                    entry = chunk.copy()
-                    entry["faiss_score"] = 0.0
-                    entry["bm25_score"] = normalized_score
-                    entry["score"] = normalized_score
-                    results[cid] = entry
-
-        # --- Combine scores (60% semantic + 40% keyword) ---
-        for cid in results:
-            results[cid]["combined_score"] = (
-                0.6 * results[cid].get("faiss_score", 0) +
-                0.4 * results[cid].get("bm25_score", 0)
-            )
-
-        sorted_results = sorted(
-            results.values(),
-            key=lambda x: x["combined_score"],
-            reverse=True
-        )[:top_k]
-
-        return sorted_results
+            return sorted_results
 
     def load_existing(self):
         """
         Load FAISS from disk and rebuild BM25 from loaded chunks.
         Call this on app startup if documents were previously uploaded.
         """
-        loaded = self.vector_store.load()
-        if loaded and self.vector_store.chunks:
-            self._build_bm25(self.vector_store.chunks)
-            print(f"✅ Hybrid retriever restored with {len(self.chunks)} chunks")
-        return loaded
+        with self.lock:
+            loaded = self.vector_store.load()
+            if loaded and self.vector_store.chunks:
+                self._build_bm25(self.vector_store.chunks)
+                print(f"✅ Hybrid retriever restored with {len(self.chunks)} chunks")
+            return loaded
 
     def get_total_chunks(self) -> int:
         return self.vector_store.get_total_chunks()
@@ -1,12 +1,21 @@
 import faiss
 import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
 import json
 import os
 from typing import List, Dict
-from core.embeddings import embed_text, embed_texts, get_embedding_dimension
+from core.embeddings import embed_cached, embed_text, get_embedding_dimension
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Brute-force search is exact and fast for small corpora; past this many
+# vectors the index is rebuilt as an HNSW graph for sub-linear search.
+HNSW_MIN_VECTORS = 2000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+
 
 def get_user_data_dir(user_id: str) -> str:
     """Get the data directory for a specific user."""
@@ -19,19 +28,47 @@ class VectorStore:
     def __init__(self, user_id: str = "global"):
         self.user_id = user_id
         self.dimension = get_embedding_dimension()
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index = faiss.IndexFlatIP(self.dimension)
         self.chunks = []
 
         # Per user paths
         user_dir = get_user_data_dir(user_id)
         self.faiss_path = os.path.join(user_dir, "faiss_index.bin")
-        self.chunks_path = os.path.join(user_dir, "chunks_metadata.json")
+        self.chunks_path = os.path.join(user_dir, "chunks.arrow")
+        # Stores saved before Arrow persistence was added
+        self.legacy_chunks_path = os.path.join(user_dir, "chunks_metadata.json")
+
+    def _build_index(self, vectors: np.ndarray):
+        """
+        Build a flat index for small corpora, HNSW once it reaches
+        HNSW_MIN_VECTORS. Both use inner product over unit vectors, so
+        search scores are cosine similarities.
+        """
+        if len(vectors) >= HNSW_MIN_VECTORS:
+            index = faiss.IndexHNSWFlat(self.dimension, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        else:
+            index = faiss.IndexFlatIP(self.dimension)
+        if len(vectors):
+            index.add(vectors)
+        return index
+
+    def _all_vectors(self) -> np.ndarray:
+        if self.index.ntotal == 0:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return self.index.reconstruct_n(0, self.index.ntotal)
 
     def add_chunks(self, chunks: List[Dict]):
         texts = [chunk["text"] for chunk in chunks]
-        embeddings = embed_texts(texts)
-        vectors = np.array(embeddings, dtype=np.float32)
-        self.index.add(vectors)
+        # float32 array straight from the embedder, no list-of-floats round trip
+        vectors = embed_cached(texts)
+        faiss.normalize_L2(vectors)
+        if isinstance(self.index, faiss.IndexFlat) and self.index.ntotal + len(vectors) >= HNSW_MIN_VECTORS:
+            # Corpus outgrew brute-force search — rebuild as HNSW
+            self.index = self._build_index(np.vstack([self._all_vectors(), vectors]))
+        else:
+            self.index.add(vectors)
         self.chunks.extend(chunks)
         print(f"✅ Added {len(chunks)} chunks. Total: {self.index.ntotal}")
 
@@ -40,40 +77,101 @@ class VectorStore:
             return []
 
         query_vector = np.array([embed_text(query)], dtype=np.float32)
-        distances, indices = self.index.search(query_vector, top_k)
+        faiss.normalize_L2(query_vector)
+        similarities, indices = self.index.search(query_vector, top_k)
 
         results = []
-        for dist, idx in zip(distances[0], indices[0]):
+        for sim, idx in zip(similarities[0], indices[0]):
             if idx == -1:
                 continue
             chunk = self.chunks[idx].copy()
-            chunk["score"] = float(1 / (1 + dist))
+            chunk["score"] = float(sim)
             results.append(chunk)
 
         return results
 
+    def delete_by_source(self, source: str) -> int:
+        """
+        Remove every chunk tagged with the given source filename.
+        Returns the number of chunks removed.
+        """
+        remove_ids = [i for i, chunk in enumerate(self.chunks) if chunk.get("source") == source]
+        if not remove_ids:
+            return 0
+
+        # HNSW can't remove vectors, so rebuild from the ones we keep; ids
+        # stay in order and aligned with self.chunks
+        keep = np.ones(self.index.ntotal, dtype=bool)
+        keep[remove_ids] = False
+        self.index = self._build_index(self._all_vectors()[keep])
+        removed = set(remove_ids)
+        self.chunks = [chunk for i, chunk in enumerate(self.chunks) if i not in removed]
+        print(f"✅ Removed {len(remove_ids)} chunks from {source}. Total: {self.index.ntotal}")
+        return len(remove_ids)
+
     def save(self):
-        faiss.write_index(self.index, self.faiss_path)
-        with open(self.chunks_path, "w") as f:
-            json.dump(self.chunks, f)
+        # Each file is written beside its target and renamed over it, so a
+        # crash mid-save never leaves a truncated index or chunk file
+        faiss_tmp = self.faiss_path + ".tmp"
+        faiss.write_index(self.index, faiss_tmp)
+        # Columnar Arrow IPC file: compact on disk, memory-mapped on load.
+        # Columns cover every key any chunk has (from_pylist would take the
+        # first row's keys only); missing values are stored as nulls
+        names = list(dict.fromkeys(key for chunk in self.chunks for key in chunk))
+        table = pa.table({name: [chunk.get(name) for chunk in self.chunks] for name in names})
+        chunks_tmp = self.chunks_path + ".tmp"
+        with pa.OSFile(chunks_tmp, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(faiss_tmp, self.faiss_path)
+        os.replace(chunks_tmp, self.chunks_path)
+        if os.path.exists(self.legacy_chunks_path):
+            os.remove(self.legacy_chunks_path)
         print(f"✅ Vector store saved for user {self.user_id[:8]}...")
 
+    def _load_chunks(self) -> List[Dict]:
+        if os.path.exists(self.chunks_path):
+            with pa.memory_map(self.chunks_path, "r") as source:
+                table = ipc.open_file(source).read_all()
+            # Convert whole columns at once (Table.to_pylist goes row by row),
+            # then zip them into rows. Arrow fills keys a chunk never had
+            # with nulls; drop them so chunk dicts keep their original shape
+            names = table.column_names
+            columns = [column.to_pylist() for column in table.columns]
+            return [
+                {k: v for k, v in zip(names, values) if v is not None}
+                for values in zip(*columns)
+            ]
+
+        with open(self.legacy_chunks_path, "r") as f:
+            return json.load(f)
+
     def load(self) -> bool:
-        if os.path.exists(self.faiss_path) and os.path.exists(self.chunks_path):
+        has_chunks = os.path.exists(self.chunks_path) or os.path.exists(self.legacy_chunks_path)
+        if os.path.exists(self.faiss_path) and has_chunks:
             self.index = faiss.read_index(self.faiss_path)
-            with open(self.chunks_path, "r") as f:
-                self.chunks = json.load(f)
+            if self.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                # Saved before the switch to inner product — rebuild from the
+                # stored vectors (embeddings were already unit length)
+                vectors = self._all_vectors()
+                if len(vectors):
+                    faiss.normalize_L2(vectors)
+                self.index = self._build_index(vectors)
+            elif isinstance(self.index, faiss.IndexHNSW):
+                self.index.hnsw.efSearch = HNSW_EF_SEARCH
+            self.chunks = self._load_chunks()
             print(f"✅ Vector store loaded — {self.index.ntotal} chunks")
             return True
         return False
 
     def clear(self):
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self.index = faiss.IndexFlatIP(self.dimension)
         self.chunks = []
         if os.path.exists(self.faiss_path):
             os.remove(self.faiss_path)
-        if os.path.exists(self.chunks_path):
-            os.remove(self.chunks_path)
+        for path in (self.chunks_path, self.legacy_chunks_path):
+            if os.path.exists(path):
+                os.remove(path)
         print(f"✅ Vector store cleared for user {self.user_id[:8]}...")
 
     def get_total_chunks(self) -> int:
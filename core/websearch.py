@@ -1,25 +1,85 @@
-from tavily import TavilyClient
-from typing import List, Dict
+from tavily import TavilyClient, AsyncTavilyClient
+from typing import List, Dict, Tuple
+from cachetools import TTLCache
 from dotenv import load_dotenv
+import asyncio
 import os
+import threading
+import weakref
 
 load_dotenv()
 
+WEB_SEARCH_TIMEOUT = 5.0  # seconds
+
+# One client for the process, so searches reuse its HTTP session and
+# keep-alive connections instead of handshaking with Tavily every time
+_tavily_client = None
+_tavily_client_lock = threading.Lock()
+
+# Async callers get an AsyncTavilyClient per event loop; its httpx pool is
+# bound to the loop it was created on
+_async_clients = weakref.WeakKeyDictionary()
+
+SEARCH_OPTIONS = {
+    "search_depth": "advanced",
+    "include_answer": True,
+    "include_raw_content": False,
+    "timeout": WEB_SEARCH_TIMEOUT
+}
+
+# Recent results are reused, and identical searches already in flight are
+# shared, so concurrent users asking the same thing cost one Tavily call
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 300  # seconds
+
+_search_cache = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+_inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+
+
+def _api_key() -> str:
+    api_key = os.getenv("TAVILY_API_KEY")
+    if not api_key:
+        raise RuntimeError("TAVILY_API_KEY is not set; web search is unavailable")
+    return api_key
+
+
+def get_tavily_client() -> TavilyClient:
+    global _tavily_client
+    if _tavily_client is None:
+        with _tavily_client_lock:
+            if _tavily_client is None:
+                _tavily_client = TavilyClient(api_key=_api_key())
+    return _tavily_client
+
+
+def get_async_tavily_client() -> AsyncTavilyClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncTavilyClient(api_key=_api_key())
+        _async_clients[loop] = client
+    return client
+
 
 def search_web(query: str, max_results: int = 5) -> List[Dict]:
     """
     Search the web using Tavily and return clean results.
     """
-    client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+    response = get_tavily_client().search(query=query, max_results=max_results, **SEARCH_OPTIONS)
+    return format_results(response)
+
 
-    response = client.search(
-        query=query,
-        search_depth="advanced",
-        max_results=max_results,
-        include_answer=True,
-        include_raw_content=False
+async def _search_web_direct(query: str, max_results: int) -> List[Dict]:
+    response = await get_async_tavily_client().search(
+        query=query, max_results=max_results, **SEARCH_OPTIONS
     )
+    return format_results(response)
 
+
+def format_results(response: Dict) -> List[Dict]:
+    """
+    Turn a Tavily response into the result dicts the agents consume.
+    """
     results = []
 
     # Add Tavily's own answer summary if available
@@ -46,6 +106,37 @@ def search_web(query: str, max_results: int = 5) -> List[Dict]:
     return results
 
 
+def _search_key(query: str, max_results: int) -> Tuple[str, int]:
+    return " ".join(query.lower().split()), max_results
+
+
+async def search_web_async(query: str, max_results: int = 5) -> List[Dict]:
+    """
+    search_web for async callers, served from the result cache or from an
+    identical search already running when possible. Runs on the event loop
+    through Tavily's async client, without a worker thread.
+    """
+    key = _search_key(query, max_results)
+    cached = _search_cache.get(key)
+    if cached is not None:
+        return list(cached)
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_search_web_direct(query, max_results))
+        _inflight[key] = task
+
+        def finish(done: asyncio.Task):
+            _inflight.pop(key, None)
+            if not done.cancelled() and done.exception() is None:
+                _search_cache[key] = done.result()
+
+        task.add_done_callback(finish)
+
+    # Shielded: a caller timing out must not cancel the search for the others
+    return list(await asyncio.shield(task))
+
+
 def search_academic(query: str, max_results: int = 5) -> List[Dict]:
     """
     Search academic/research focused content.
@@ -2,11 +2,20 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from slowapi.middleware import SlowAPIMiddleware
+from slowapi.middleware import SlowAPIASGIMiddleware
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from core.database import init_db
+from core.vectorstore import VectorStore
+from core.retriever import HybridRetriever
+from core.embeddings import get_model, get_embed_cache
 from core.security import limiter
+from core.logging_config import start_logging, stop_logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
 import os
+import weakref
 
 load_dotenv()
 
@@ -17,57 +26,182 @@ app = FastAPI(
 )
 
 # Rate limiter
+# Added before CORS so it sits inside it: the last middleware added runs
+# first, and CORS answers preflight OPTIONS requests without calling inward.
+# Pure ASGI rather than BaseHTTPMiddleware, so streamed responses pass through
+# untouched.
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+app.add_middleware(SlowAPIASGIMiddleware)
 
 # CORS
-ALLOWED_ORIGINS = os.getenv(
-    "ALLOWED_ORIGINS",
-    "http://localhost:5173,http://localhost:3000"
-).split(",")
+ALLOWED_ORIGINS = tuple(
+    origin.strip() for origin in os.getenv(
+        "ALLOWED_ORIGINS",
+        "http://localhost:5173,http://localhost:3000"
+    ).split(",")
+)
+
+# Explicit lists: preflights are checked against a fixed set instead of
+# echoing back whatever the browser asks for
+ALLOWED_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS"]
+ALLOWED_HEADERS = ["Authorization", "Content-Type"]
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=ALLOWED_METHODS,
+    allow_headers=ALLOWED_HEADERS,
+    expose_headers=["X-Next-Cursor"],
 )
 
-# Per-user retriever cache
-user_retrievers = {}
+# Load the embedding model and its cache during startup rather than on the
+# first request that needs them. Disable for tests or quick local restarts.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
 
+# Worker threads behind asyncio.to_thread (agent I/O, PDF parsing, indexing, DB writes)
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", min(32, (os.cpu_count() or 1) * 4)))
 
-def get_user_retriever(user_id: str):
-    if user_id not in user_retrievers:
-        from core.vectorstore import VectorStore
-        from core.retriever import HybridRetriever
+# Per-user retriever cache — bounded, idle users are reloaded from disk on demand.
+# Each entry holds a user's FAISS index, BM25 index and chunks in RAM.
+RETRIEVER_CACHE_SIZE = int(os.getenv("RETRIEVER_CACHE_MAX", 64))
+RETRIEVER_CACHE_TTL = 1800  # seconds
 
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        user_data_dir = os.path.join(BASE_DIR, "data", "users", user_id)
-        os.makedirs(user_data_dir, exist_ok=True)
 
-        vector_store = VectorStore(user_id=user_id)
-        retriever = HybridRetriever(vector_store)
+class RetrieverCache(TTLCache):
+    """
+    TTL + LRU cache of user retrievers that counts hits, misses and evictions.
+    """
 
-        loaded = retriever.load_existing()
-        if loaded:
-            print(f"✅ Loaded existing vector store for user {user_id[:8]}...")
-        else:
-            print(f"📭 New vector store created for user {user_id[:8]}...")
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
+    def lookup(self, user_id: str):
+        retriever = self.get(user_id)
+        if retriever is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return retriever
+
+    # An evicted retriever is only dereferenced, not torn down: a request may
+    # still be searching it, and its FAISS index is freed once that finishes.
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.evictions += len(expired)
+        return expired
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self),
+            "max_size": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+user_retrievers = RetrieverCache(maxsize=RETRIEVER_CACHE_SIZE, ttl=RETRIEVER_CACHE_TTL)
+
+
+# One lock per user, held while their retriever loads (so concurrent first
+# requests share a single load) and while their documents change (so two
+# writers never save over each other, even across an eviction and reload).
+# Entries disappear once no request holds the lock.
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _get_user_lock(user_id: str) -> asyncio.Lock:
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    return lock
+
+
+def _load_user_retriever(user_id: str):
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+    user_data_dir = os.path.join(BASE_DIR, "data", "users", user_id)
+    os.makedirs(user_data_dir, exist_ok=True)
+
+    vector_store = VectorStore(user_id=user_id)
+    retriever = HybridRetriever(vector_store)
+
+    loaded = retriever.load_existing()
+    if loaded:
+        print(f"✅ Loaded existing vector store for user {user_id[:8]}...")
+    else:
+        print(f"📭 New vector store created for user {user_id[:8]}...")
+    return retriever
+
+
+async def _ensure_user_retriever(user_id: str):
+    # Caller holds the user's lock
+    retriever = user_retrievers.get(user_id)
+    if retriever is None:
+        # FAISS and chunk loading hit the disk; keep it off the event loop
+        retriever = await asyncio.to_thread(_load_user_retriever, user_id)
         user_retrievers[user_id] = retriever
+    return retriever
+
 
-    return user_retrievers[user_id]
+async def get_user_retriever(user_id: str):
+    retriever = user_retrievers.lookup(user_id)
+    if retriever is not None:
+        return retriever
+
+    async with _get_user_lock(user_id):
+        # Another request may have finished loading while we waited
+        return await _ensure_user_retriever(user_id)
+
+
+@asynccontextmanager
+async def locked_user_retriever(user_id: str):
+    """
+    Yield the user's retriever while holding their lock, for changes to
+    the index and the files saved from it.
+    """
+    async with _get_user_lock(user_id):
+        yield await _ensure_user_retriever(user_id)
 
 
 @app.on_event("startup")
 async def startup_event():
+    start_logging()
     print("🚀 ResearchMind API starting up...")
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="researchmind")
+    )
     init_db()
+
+    if WARMUP_ON_STARTUP:
+        try:
+            await asyncio.to_thread(get_model)
+            await asyncio.to_thread(get_embed_cache)
+        except Exception as e:
+            print(f"⚠️ Warmup failed, loading lazily instead: {e}")
+
+    from api.websocket import sweep_rate_limits
+    from core.history import history_writer
+    app.state.rate_limit_sweeper = asyncio.create_task(sweep_rate_limits())
+    app.state.history_writer = asyncio.create_task(history_writer())
     print("✅ ResearchMind API ready!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    from core.history import stop_history_writer, flush_history
+    await stop_history_writer(app.state.history_writer)
+    await flush_history()
+    stop_logging()
+
 @app.get("/")
 async def root():
     return {
@@ -82,7 +216,8 @@ async def root():
 async def health_check():
     return {
         "status": "healthy",
-        "active_users": len(user_retrievers)
+        "active_users": len(user_retrievers),
+        "retriever_cache": user_retrievers.stats()
     }
 
 
@@ -1,70 +1,399 @@
 import fitz  # PyMuPDF
+import hashlib
+import math
+import multiprocessing
+import numpy as np
 import os
-from typing import List, Dict
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import re
+import shutil
+import threading
+from cachetools import LRUCache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, fields
+from typing import Iterator, List, Dict, Optional, Tuple
 
+# Text extraction is CPU-bound inside MuPDF, so larger PDFs are split into
+# page ranges extracted in worker processes. Small PDFs aren't worth the hop.
+PARALLEL_MIN_PAGES = 4
+MAX_PDF_WORKERS = min(os.cpu_count() or 1, 4)
 
-def parse_pdf(file_path: str) -> List[Dict]:
+_WORD_RE = re.compile(r"\S+")
+
+# Whitespace after a sentence terminator that is followed by a capital letter.
+# Chunk ends are pulled back to such a boundary when one lies within the
+# last SENTENCE_SNAP_FRACTION of the chunk (and inside its overlap).
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z])")
+SENTENCE_SNAP_FRACTION = 0.2
+
+# Plain-text extraction only: keep ligatures and whitespace as get_text()
+# does, never decode images into the TextPage, and rejoin words hyphenated
+# across line breaks so they index as one token
+TEXT_FLAGS = (
+    fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_PRESERVE_WHITESPACE
+    | fitz.TEXT_MEDIABOX_CLIP | fitz.TEXT_DEHYPHENATE
+) & ~fitz.TEXT_PRESERVE_IMAGES
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Parsed chunks are cached by a hash of the file bytes, so re-uploading or
+# re-indexing an unchanged PDF skips extraction entirely. Callers pass the
+# cache directory (one per user, so it is deleted with the user's data).
+# Bump the version whenever extraction or chunking output changes.
+PDF_CACHE_VERSION = 5
+PDF_CACHE_MAX_ENTRIES = 20  # per cache directory, oldest removed first
+PDF_CACHE_MEMORY_SIZE = 32  # most recent documents kept in process
+
+_parsed_cache = LRUCache(maxsize=PDF_CACHE_MEMORY_SIZE)
+_parsed_cache_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class Chunk:
     """
-    Parse a PDF file and split into chunks.
-    Returns a list of chunks with text and metadata.
+    One chunk of document text. Slotted to keep large documents compact in
+    memory and in the parse cache; converted to a dict (the retriever's
+    format) only when it is indexed.
+    """
+    chunk_id: int
+    text: str
+    word_count: int
+    start_word: int
+    end_word: int
+
+    def to_dict(self, source: Optional[str] = None) -> Dict:
+        chunk = {
+            "chunk_id": self.chunk_id,
+            "text": self.text,
+            "word_count": self.word_count,
+            "start_word": self.start_word,
+            "end_word": self.end_word
+        }
+        if source is not None:
+            chunk["source"] = source
+        return chunk
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the server process is multi-threaded
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """
+    Drop a pool whose workers died, so the next _get_pool() spawns a fresh one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_text(page) -> str:
+    # A page without font resources can't draw any text (e.g. a scanned
+    # image); skip running MuPDF's text pipeline over it
+    if not page.get_fonts():
+        return ""
+    textpage = page.get_textpage(flags=TEXT_FLAGS)
+    return textpage.extractText()
+
+
+def _extract_pages(file_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """
+    Worker: extract the text of pages [start, stop). Opens the PDF by path,
+    since fitz documents and pages can't be pickled.
+    """
+    doc = fitz.open(file_path)
+    pages = [(n, _page_text(doc.load_page(n))) for n in range(start, stop)]
+    doc.close()
+    return pages
+
+
+def extract_page_texts(file_path: str, doc: Optional[fitz.Document] = None) -> List[Tuple[int, str]]:
+    """
+    Extract (page_num, text) for every page, in page order.
+    Small PDFs are read from doc when the caller already has it open.
+    """
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(file_path)
+    try:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES or MAX_PDF_WORKERS < 2:
+            return [(n, _page_text(page)) for n, page in enumerate(doc)]
+    finally:
+        if own_doc:
+            doc.close()
+
+    step = math.ceil(page_count / MAX_PDF_WORKERS)
+    pool = None
+    try:
+        pool = _get_pool()
+        futures = [
+            pool.submit(_extract_pages, file_path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool) and pool is not None:
+            # A broken pool fails every later submit; replace it
+            _discard_pool(pool)
+        print(f"⚠️ Parallel PDF extraction failed ({e}), extracting sequentially")
+        return _extract_pages(file_path, 0, page_count)
+
+
+def pdf_cache_key(data: bytes, chunk_size: int, overlap: int) -> str:
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(f"|v{PDF_CACHE_VERSION}|{chunk_size}|{overlap}".encode())
+    return digest.hexdigest()
+
+
+# Cache entries are Arrow IPC files with one column per Chunk field, the same
+# format the vector store persists chunks in
+CHUNK_FIELDS = [field.name for field in fields(Chunk)]
+
+
+def _read_chunk_table(path: str) -> List[Chunk]:
+    with pa.memory_map(path, "r") as source:
+        table = ipc.open_file(source).read_all()
+    # Column-wise conversion, then one positional Chunk per row
+    columns = [table.column(name).to_pylist() for name in CHUNK_FIELDS]
+    return [Chunk(*row) for row in zip(*columns)]
+
+
+def _write_chunk_table(path: str, chunks: List[Chunk]):
+    table = pa.table({
+        name: [getattr(chunk, name) for chunk in chunks] for name in CHUNK_FIELDS
+    })
+    with pa.OSFile(path, "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"{key}.arrow")
+
+
+def load_cached_chunks(cache_dir: str, key: str) -> Optional[List[Chunk]]:
+    with _parsed_cache_lock:
+        chunks = _parsed_cache.get((cache_dir, key))
+    if chunks is None:
+        try:
+            chunks = _read_chunk_table(_cache_path(cache_dir, key))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable PDF cache entry {key}: {e}")
+            return None
+        with _parsed_cache_lock:
+            _parsed_cache[(cache_dir, key)] = chunks
+    return list(chunks)
+
+
+def store_cached_chunks(cache_dir: str, key: str, chunks: List[Chunk]):
+    with _parsed_cache_lock:
+        _parsed_cache[(cache_dir, key)] = chunks
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_path = _cache_path(cache_dir, key)
+        # Write then rename, so a concurrent reader never sees a partial file
+        partial_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.part"
+        _write_chunk_table(partial_path, chunks)
+        os.replace(partial_path, cache_path)
+        _prune_cache_dir(cache_dir)
+    except Exception as e:
+        print(f"⚠️ Could not write PDF cache entry {key}: {e}")
+
+
+def _prune_cache_dir(cache_dir: str):
+    entries = [
+        entry for entry in os.scandir(cache_dir) if entry.name.endswith(".arrow")
+    ]
+    if len(entries) <= PDF_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:len(entries) - PDF_CACHE_MAX_ENTRIES]:
+        _drop_cached_chunks(cache_dir, entry.name[:-len(".arrow")])
+
+
+def _drop_cached_chunks(cache_dir: str, key: str):
+    with _parsed_cache_lock:
+        _parsed_cache.pop((cache_dir, key), None)
+    try:
+        os.remove(_cache_path(cache_dir, key))
+    except FileNotFoundError:
+        pass
+
+
+def forget_cached_pdf(file_path: str, cache_dir: str):
+    """
+    Remove the cached chunks of one PDF, e.g. before the file is deleted.
     """
+    data = _read_pdf(file_path)
+    _drop_cached_chunks(cache_dir, pdf_cache_key(data, chunk_size=300, overlap=50))
+
+
+def clear_pdf_cache(cache_dir: str):
+    """
+    Remove every cached PDF in cache_dir, on disk and in process.
+    """
+    with _parsed_cache_lock:
+        for cache_key in [k for k in _parsed_cache if k[0] == cache_dir]:
+            del _parsed_cache[cache_key]
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def _read_pdf(file_path: str) -> bytes:
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"PDF file not found: {file_path}")
+    with open(file_path, "rb") as f:
+        return f.read()
 
-    doc = fitz.open(file_path)
-    full_text = ""
+
+def _open_once(data: bytes) -> fitz.Document:
+    # Opened from the bytes already read for the cache key, not from disk again
+    return fitz.open(stream=data, filetype="pdf")
+
+
+def _parse_document(
+    file_path: str, doc: fitz.Document, cache_dir: Optional[str], key: str
+) -> List[Chunk]:
+    parts = []
 
     # Extract text from all pages
-    for page_num, page in enumerate(doc):
-        text = page.get_text()
+    for page_num, text in extract_page_texts(file_path, doc):
         if text.strip():
-            full_text += f"\n[Page {page_num + 1}]\n{text}"
+            parts.append(f"\n[Page {page_num + 1}]\n{text}")
 
-    doc.close()
+    full_text = "".join(parts)
 
     # Split into chunks
     chunks = split_into_chunks(full_text, chunk_size=300, overlap=50)
-    return chunks
+    if cache_dir is not None:
+        store_cached_chunks(cache_dir, key, chunks)
+    return list(chunks)
 
 
-def split_into_chunks(text: str, chunk_size: int = 300, overlap: int = 50) -> List[Dict]:
+def parse_pdf(file_path: str, cache_dir: Optional[str] = None) -> List[Chunk]:
     """
-    Split text into overlapping chunks by word count.
+    Parse a PDF file and split into chunks.
+    Returns a list of chunks with text and metadata.
+    Results are cached in cache_dir when one is given.
     """
-    words = text.split()
-    chunks = []
-    start = 0
-    chunk_index = 0
+    data = _read_pdf(file_path)
+    key = pdf_cache_key(data, chunk_size=300, overlap=50)
+    if cache_dir is not None:
+        cached = load_cached_chunks(cache_dir, key)
+        if cached is not None:
+            return cached
+
+    with _open_once(data) as doc:
+        return _parse_document(file_path, doc, cache_dir, key)
 
-    while start < len(words):
-        end = start + chunk_size
-        chunk_words = words[start:end]
-        chunk_text = " ".join(chunk_words)
 
-        chunks.append({
-            "chunk_id": chunk_index,
-            "text": chunk_text,
-            "word_count": len(chunk_words),
-            "start_word": start,
-            "end_word": end
-        })
+def ingest_pdf(file_path: str, cache_dir: Optional[str] = None) -> Dict:
+    """
+    Parse a PDF and read its metadata with a single open of the document.
+    Returns {"metadata": ..., "chunks": ...}.
+    """
+    data = _read_pdf(file_path)
+    key = pdf_cache_key(data, chunk_size=300, overlap=50)
 
-        chunk_index += 1
-        start += chunk_size - overlap  # move forward with overlap
+    with _open_once(data) as doc:
+        metadata = get_pdf_metadata(file_path, doc)
+        chunks = load_cached_chunks(cache_dir, key) if cache_dir is not None else None
+        if chunks is None:
+            chunks = _parse_document(file_path, doc, cache_dir, key)
 
-    return chunks
+    return {"metadata": metadata, "chunks": chunks}
 
 
-def get_pdf_metadata(file_path: str) -> Dict:
+def _build_chunks(text: str, chunk_size: int, overlap: int) -> Iterator[Chunk]:
+    """
+    Yield overlapping chunks by word count, in order, ending each chunk at
+    a sentence boundary where one is close enough.
+    Chunks are sliced straight out of the text using word offsets, so no
+    per-word strings or re-joined copies are built.
+    """
+    # (start, end) character offsets of every word, found in one pass
+    spans = np.fromiter(
+        (i for m in _WORD_RE.finditer(text) for i in m.span()), dtype=np.int64
+    ).reshape(-1, 2)
+    total_words = len(spans)
+
+    # Word and character bounds of every chunk, computed in bulk.
+    # Each chunk is one slice of text; the overlap is copied into both
+    # neighbours because str slices and concatenations never share buffers.
+    starts = np.arange(0, total_words, chunk_size - overlap, dtype=np.int64)
+    ends = starts + chunk_size
+    lasts = np.minimum(ends, total_words)
+
+    # Word count up to each sentence end, i.e. the exclusive end word index
+    boundaries = np.fromiter(
+        (m.start() for m in _SENTENCE_END_RE.finditer(text)), dtype=np.int64
+    )
+    sentence_ends = np.searchsorted(spans[:, 1], boundaries) + 1
+
+    if len(sentence_ends):
+        # Only snap within the overlap, so the next chunk still starts
+        # before this one ends and no words fall between them
+        window = min(overlap, int(chunk_size * SENTENCE_SNAP_FRACTION))
+        idx = np.searchsorted(sentence_ends, lasts, side="right") - 1
+        candidates = sentence_ends[np.maximum(idx, 0)]
+        snap = (idx >= 0) & (candidates > lasts - window) & (lasts < total_words)
+        lasts = np.where(snap, candidates, lasts)
+        ends = np.where(snap, candidates, ends)
+
+    char_starts = spans[starts, 0].tolist()
+    char_ends = spans[lasts - 1, 1].tolist()
+
+    for chunk_index, (start, end, last, char_start, char_end) in enumerate(
+        zip(starts.tolist(), ends.tolist(), lasts.tolist(), char_starts, char_ends)
+    ):
+        yield Chunk(
+            chunk_id=chunk_index,
+            text=text[char_start:char_end],
+            word_count=last - start,
+            start_word=start,
+            end_word=end
+        )
+
+
+def split_into_chunks(text: str, chunk_size: int = 300, overlap: int = 50) -> List[Chunk]:
+    """
+    Split text into overlapping chunks by word count.
+    """
+    return list(_build_chunks(text, chunk_size, overlap))
+
+
+def get_pdf_metadata(file_path: str, doc: Optional[fitz.Document] = None) -> Dict:
     """
     Extract basic metadata from a PDF.
+    Pass doc to read it from an already open document.
     """
-    doc = fitz.open(file_path)
+    own_doc = doc is None
+    if own_doc:
+        doc = fitz.open(file_path)
     metadata = {
         "filename": os.path.basename(file_path),
         "page_count": len(doc),
         "title": doc.metadata.get("title", "Unknown"),
         "author": doc.metadata.get("author", "Unknown"),
     }
-    doc.close()
+    if own_doc:
+        doc.close()
     return metadata
\ No newline at end of file